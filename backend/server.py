@@ -1,24 +1,41 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Form, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status, Form, Query, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, Iterable, Tuple, Union
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
 import jwt
 import bcrypt
-import pandas as pd
-from io import BytesIO
 import base64
+import json
+import hashlib
 import shutil
 import re
+import time
+import calendar
+from abc import ABC, abstractmethod
+from email.utils import format_datetime, parsedate_to_datetime
+import bisect
+import itertools
+import functools
 import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import signal
+
+import sheet_parser
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -36,6 +53,60 @@ MASTER_ADMIN_EMAIL = os.environ.get("MASTER_ADMIN_EMAIL", "Personal@admin.com")
 MASTER_ADMIN_PASSWORD = os.environ.get("MASTER_ADMIN_PASSWORD", "admin123")
 MASTER_ADMIN_NAME = os.environ.get("MASTER_ADMIN_NAME", "administrador")
 
+# Authenticated user cache (per process)
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "2048"))
+
+# Password hashing worker pool
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_MAX_CONCURRENCY", str(PASSWORD_HASH_WORKERS)))
+
+# Batch size for the users.email_lower backfill run at startup
+EMAIL_BACKFILL_BATCH_SIZE = int(os.environ.get("EMAIL_BACKFILL_BATCH_SIZE", "500"))
+
+# Recurring billing: how often to generate the current month's payments for
+# every active plan (0 disables the scheduled run; the endpoint still works)
+BILLING_AUTO_GENERATE_INTERVAL_SECONDS = float(os.environ.get("BILLING_AUTO_GENERATE_INTERVAL_SECONDS", "0"))
+BILLING_BULK_BATCH_SIZE = 1000
+
+# Rows per bulk write when rebuilding a student's progress rollups
+PROGRESS_ROLLUP_BATCH_SIZE = 1000
+
+# Overdue payment sweep (0 disables it); only recent due dates notify
+OVERDUE_SWEEP_INTERVAL_SECONDS = float(os.environ.get("OVERDUE_SWEEP_INTERVAL_SECONDS", "0"))
+OVERDUE_NOTIFY_WINDOW_DAYS = int(os.environ.get("OVERDUE_NOTIFY_WINDOW_DAYS", "30"))
+
+# Leaderboard: how often streaks that no longer reach today are reset
+LEADERBOARD_DECAY_INTERVAL_SECONDS = float(os.environ.get("LEADERBOARD_DECAY_INTERVAL_SECONDS", "300"))
+
+# Real-time events (WebSocket push)
+EVENT_BROKER = os.environ.get("EVENT_BROKER", "local")
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "100"))
+# Seconds a new WebSocket has to send its auth message
+EVENT_AUTH_TIMEOUT_SECONDS = 10
+
+# Maximum number of exercise logs accepted by POST /progress/batch
+PROGRESS_BATCH_MAX_ENTRIES = 100
+
+# Offline sync limits; the lag keeps the pull cursor behind clock skew between processes
+SYNC_MAX_OPERATIONS = 500
+SYNC_PULL_LIMIT = 500
+SYNC_SETTLE_SECONDS = 2
+
+# Workout sheet uploads: size limit, parser worker processes, uploads allowed
+# to wait for a worker, and how long one sheet may take to parse
+SHEET_UPLOAD_MAX_BYTES = int(os.environ.get("SHEET_UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+SHEET_PARSE_WORKERS = int(os.environ.get("SHEET_PARSE_WORKERS", "2"))
+SHEET_PARSE_MAX_QUEUE = int(os.environ.get("SHEET_PARSE_MAX_QUEUE", "8"))
+SHEET_PARSE_TIMEOUT_SECONDS = float(os.environ.get("SHEET_PARSE_TIMEOUT_SECONDS", "30"))
+
+# Batch size for the exercise_library.search_tokens backfill run at startup
+LIBRARY_SEARCH_BACKFILL_BATCH_SIZE = 500
+
+# Exercise media catalogs: staleness bound across workers and personals kept
+EXERCISE_CATALOG_TTL_SECONDS = float(os.environ.get("EXERCISE_CATALOG_TTL_SECONDS", "300"))
+EXERCISE_CATALOG_MAX_ENTRIES = int(os.environ.get("EXERCISE_CATALOG_MAX_ENTRIES", "256"))
+
 # Upload directory for exercise images
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -134,23 +205,122 @@ def normalize_youtube_url(url: Optional[str]) -> Optional[str]:
         return f"https://www.youtube.com/embed/{match.group(1)}"
     return url
 
+def normalize_exercise_name(name: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", str(name or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+# Longest catalog key inside the name wins (leftmost on ties), else the shortest key containing it
+class ExerciseNameMatcher:
+
+    def __init__(
+        self,
+        entries: Iterable[Tuple[str, Optional[str]]],
+        cache_size: int = 4096,
+        base: Optional["ExerciseNameMatcher"] = None
+    ):
+        self._base = base
+        self._values: Dict[str, str] = {}
+        for key, value in entries:
+            key = normalize_exercise_name(key)
+            if key and value:
+                self._values[key] = value
+
+        goto: List[Dict[str, int]] = [{}]
+        longest: List[Optional[str]] = [None]
+        for key in self._values:
+            state = 0
+            for ch in key:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    longest.append(None)
+                state = next_state
+            longest[state] = key
+
+        # Breadth-first so a state's failure target is always finished first
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                target = fail[state]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[next_state] = goto[target].get(ch, 0)
+                if longest[next_state] is None:
+                    longest[next_state] = longest[fail[next_state]]
+                queue.append(next_state)
+
+        self._goto = goto
+        self._fail = fail
+        self._longest = longest
+        # Shortest first and joined by newlines (never inside a normalized
+        # name), so the first str.find hit is the shortest key containing it
+        self._keys = sorted(self._values, key=len)
+        self._key_starts = list(itertools.accumulate((len(key) + 1 for key in self._keys[:-1]), initial=0))
+        self._joined_keys = "\n".join(self._keys)
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self._values) + (len(self._base) if self._base is not None else 0)
+
+    def _value(self, key: str) -> Optional[str]:
+        value = self._values.get(key)
+        if value is None and self._base is not None:
+            value = self._base._value(key)
+        return value
+
+    def _longest_inside(self, text: str) -> Optional[Tuple[int, int, str]]:
+        # (length, -end, key), so max() is the longest key, leftmost on ties
+        goto, fail, longest = self._goto, self._fail, self._longest
+        state = 0
+        best = None
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            key = longest[state]
+            if key and (best is None or len(key) > best[0]):
+                best = (len(key), -end, key)
+        if self._base is not None:
+            inherited = self._base._longest_inside(text)
+            if inherited is not None and (best is None or inherited[:2] > best[:2]):
+                best = inherited
+        return best
+
+    def _shortest_containing(self, text: str) -> Optional[str]:
+        position = self._joined_keys.find(text)
+        best = self._keys[bisect.bisect_right(self._key_starts, position) - 1] if position != -1 else None
+        if self._base is not None:
+            inherited = self._base._shortest_containing(text)
+            if inherited is not None and (best is None or len(inherited) <= len(best)):
+                best = inherited
+        return best
+
+    def _lookup(self, name: Optional[str]) -> Optional[str]:
+        text = normalize_exercise_name(name)
+        if not text:
+            return None
+        value = self._value(text)
+        if value is not None:
+            return value
+        found = self._longest_inside(text)
+        key = found[2] if found else self._shortest_containing(text)
+        return self._value(key) if key else None
+
+BUILTIN_IMAGE_ENTRIES = list(EXERCISE_IMAGES.items())
+BUILTIN_VIDEO_ENTRIES = [(key, normalize_youtube_url(url)) for key, url in EXERCISE_VIDEOS.items()]
+EXERCISE_IMAGE_MATCHER = ExerciseNameMatcher(BUILTIN_IMAGE_ENTRIES)
+EXERCISE_VIDEO_MATCHER = ExerciseNameMatcher(BUILTIN_VIDEO_ENTRIES)
+
 def get_exercise_image(exercise_name: str) -> Optional[str]:
-    name_lower = exercise_name.lower().strip()
-    if name_lower in EXERCISE_IMAGES:
-        return EXERCISE_IMAGES[name_lower]
-    for key, url in EXERCISE_IMAGES.items():
-        if key in name_lower or name_lower in key:
-            return url
-    return None
+    return EXERCISE_IMAGE_MATCHER.lookup(exercise_name)
 
 def resolve_exercise_video_url(exercise_name: str) -> Optional[str]:
-    name_lower = exercise_name.lower().strip()
-    if name_lower in EXERCISE_VIDEOS:
-        return normalize_youtube_url(EXERCISE_VIDEOS[name_lower])
-    for key, url in EXERCISE_VIDEOS.items():
-        if key in name_lower or name_lower in key:
-            return normalize_youtube_url(url)
-    return None
+    return EXERCISE_VIDEO_MATCHER.lookup(exercise_name)
 
 # ==================== MODELS ====================
 
@@ -356,6 +526,7 @@ class FinancialPlanCreate(BaseModel):
     due_day: int  # Day of month (1-31)
     start_date: str
     status: str = "active"  # "active", "inactive"
+    duration_months: Optional[int] = Field(default=None, ge=1, le=12)  # Billing cycle; inferred from the name when omitted
 
 class FinancialPaymentCreate(BaseModel):
     student_id: str
@@ -373,6 +544,10 @@ class FinancialPaymentUpdate(BaseModel):
     payment_method: Optional[str] = None
     notes: Optional[str] = None
 
+class BillingRunCreate(BaseModel):
+    period: Optional[str] = Field(default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$")  # "YYYY-MM", defaults to current month
+    student_id: Optional[str] = None
+
 # ==================== WORKOUT MODELS ====================
 
 class ExerciseCreate(BaseModel):
@@ -407,6 +582,23 @@ class WorkoutResponse(BaseModel):
     updated_at: str
     version: int
 
+class WorkoutDaySummary(BaseModel):
+    day_name: str
+    exercises_count: int
+
+class WorkoutSummaryResponse(BaseModel):
+    id: str
+    name: str
+    student_id: str
+    personal_id: str
+    routine_id: Optional[str] = None
+    days: List[WorkoutDaySummary]
+    days_count: int
+    exercises_count: int
+    created_at: str
+    updated_at: str
+    version: int
+
 # ==================== PROGRESS MODELS ====================
 
 class ProgressLog(BaseModel):
@@ -416,6 +608,9 @@ class ProgressLog(BaseModel):
     sets_completed: List[dict]
     notes: Optional[str] = None
     difficulty: Optional[int] = None  # 1-5 scale
+    # Idempotency key generated by the client; retries with the same key
+    # return the original log instead of creating a duplicate
+    client_op_id: Optional[str] = Field(default=None, min_length=1, max_length=100)
 
 class ProgressResponse(BaseModel):
     id: str
@@ -438,6 +633,7 @@ class WorkoutSessionCreate(BaseModel):
     feedback: Optional[str] = None
     recovery_score: Optional[int] = Field(default=None, ge=1, le=10)
     effort_score: Optional[int] = Field(default=None, ge=1, le=10)
+    client_op_id: Optional[str] = Field(default=None, min_length=1, max_length=100)
 
 class WorkoutSessionResponse(BaseModel):
     id: str
@@ -456,6 +652,28 @@ class WorkoutSessionResponse(BaseModel):
     estimated_calories: int = 0
     completed_at: str
 
+class ProgressBatchCreate(BaseModel):
+    entries: List[ProgressLog] = Field(min_length=1, max_length=PROGRESS_BATCH_MAX_ENTRIES)
+    # When present, the workout day is finalized in the same call
+    session: Optional[WorkoutSessionCreate] = None
+
+class ProgressBatchResponse(BaseModel):
+    progress: List[ProgressResponse]
+    session: Optional[WorkoutSessionResponse] = None
+
+# ==================== OFFLINE SYNC MODELS ====================
+
+class SyncOperation(BaseModel):
+    op_id: str = Field(min_length=1, max_length=100)  # idempotency key
+    type: Literal["progress", "session"]
+    performed_at: Optional[str] = None  # client clock, ISO 8601
+    progress: Optional[ProgressLog] = None
+    session: Optional[WorkoutSessionCreate] = None
+
+class SyncRequest(BaseModel):
+    operations: List[SyncOperation] = Field(default_factory=list, max_length=SYNC_MAX_OPERATIONS)
+    cursor: Optional[str] = None  # returned by the previous sync
+
 # ==================== CHECK-IN MODELS ====================
 
 class CheckInCreate(BaseModel):
@@ -502,6 +720,74 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+# bcrypt releases the GIL, so a small thread pool hashes off the event loop
+class PasswordHasher:
+
+    def __init__(self, workers: int, max_concurrency: int):
+        self.workers = max(1, workers)
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._ops: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, op: str, wait_seconds: float, run_seconds: float) -> None:
+        stats = self._ops.setdefault(op, {
+            "count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0
+        })
+        stats["count"] += 1
+        stats["total_seconds"] += run_seconds
+        stats["max_seconds"] = max(stats["max_seconds"], run_seconds)
+        stats["total_wait_seconds"] += wait_seconds
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait_seconds)
+
+    async def _run(self, op: str, func, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._record(op, started_at - queued_at, time.perf_counter() - started_at)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run("verify", verify_password, password, hashed)
+
+    def stats(self) -> Dict[str, Any]:
+        operations = {}
+        for op, stats in self._ops.items():
+            count = stats["count"] or 1
+            operations[op] = {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_seconds"] / count * 1000, 2),
+                "max_ms": round(stats["max_seconds"] * 1000, 2),
+                "avg_wait_ms": round(stats["total_wait_seconds"] / count * 1000, 2),
+                "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 2),
+            }
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "operations": operations,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_CONCURRENCY)
+
 def create_token(user_id: str, role: str) -> str:
     payload = {
         "user_id": user_id,
@@ -510,15 +796,90 @@ def create_token(user_id: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# Writes that change a user must call invalidate(); the TTL bounds staleness across workers
+class UserCache:
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(user)
+
+    def set(self, user_id: str, user: dict, generation: int) -> None:
+        # A concurrent invalidation happened while the caller was reading the
+        # database, so its copy may already be stale.
+        if not self.enabled or generation != self._generation:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, dict(user))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *user_ids: str) -> None:
+        self._generation += 1
+        for user_id in user_ids:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await resolve_user_from_token(credentials.credentials)
+
+async def resolve_user_from_token(token: str) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("user_id")
         if not user_id:
             raise HTTPException(status_code=401, detail="Token inválido")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuário não encontrado")
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="Usuário não encontrado")
+            user_cache.set(user_id, user, generation)
         if user.get("role") == "personal" and user.get("is_approved", True) is not True:
             raise HTTPException(status_code=403, detail="Conta de personal aguardando aprovacao do administrador")
         return user
@@ -537,11 +898,304 @@ async def get_admin_user(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Acesso restrito ao administrador")
     return current_user
 
+def normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+USERS_EMAIL_INDEX = IndexModel(
+    [("email_lower", 1)],
+    name="email_lower_unique",
+    unique=True,
+    partialFilterExpression={"email_lower": {"$exists": True}}
+)
+
+email_backfill_state: Dict[str, Any] = {"done": False, "updated": 0, "conflicts": 0}
+
 async def find_user_by_email(email: str, projection: Optional[Dict[str, int]] = None):
+    user = await db.users.find_one({"email_lower": normalize_email(email)}, projection)
+    if user or email_backfill_state["done"]:
+        return user
+    # Users created before email_lower existed are found by the old scan until
+    # the startup backfill has reached them.
     escaped_email = re.escape((email or "").strip())
-    query = {"email": {"$regex": f"^{escaped_email}$", "$options": "i"}}
+    query = {"email": {"$regex": f"^{escaped_email}$", "$options": "i"}, "email_lower": {"$exists": False}}
     return await db.users.find_one(query, projection)
 
+async def backfill_user_email_lower(batch_size: int = EMAIL_BACKFILL_BATCH_SIZE):
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"email_lower": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.users.find(query, {"_id": 1, "email": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        operations = [
+            UpdateOne(
+                {"_id": u["_id"], "email_lower": {"$exists": False}},
+                {"$set": {"email_lower": normalize_email(u.get("email"))}}
+            )
+            for u in batch
+        ]
+        try:
+            result = await db.users.bulk_write(operations, ordered=False)
+            email_backfill_state["updated"] += result.modified_count
+        except BulkWriteError as e:
+            conflicts = [err for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+            email_backfill_state["updated"] += e.details.get("nModified", 0)
+            email_backfill_state["conflicts"] += len(conflicts)
+            for err in conflicts:
+                logger.warning("Email duplicado (ignorado no backfill): %s", err.get("op", {}).get("q"))
+            if len(conflicts) != len(e.details.get("writeErrors", [])):
+                raise
+        await asyncio.sleep(0)
+    email_backfill_state["done"] = True
+    logger.info(
+        "Backfill de email_lower concluido: %s atualizados, %s conflitos",
+        email_backfill_state["updated"], email_backfill_state["conflicts"]
+    )
+
+# ==================== REALTIME EVENTS ====================
+
+# publish() must reach every worker that started the broker, the publisher included
+class EventBroker(ABC):
+
+    @abstractmethod
+    async def start(self, deliver) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, user_id: str, event: dict) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+class LocalEventBroker(EventBroker):
+
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, user_id: str, event: dict) -> None:
+        if self._deliver:
+            await self._deliver(user_id, event)
+
+EVENT_BROKERS = {
+    "local": LocalEventBroker,
+}
+
+class EventHub:
+
+    def __init__(self, broker: EventBroker, queue_size: int):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, set] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    async def publish(self, user_id: str, event_type: str, data: dict) -> None:
+        self.published += 1
+        try:
+            await self.broker.publish(user_id, {"type": event_type, "data": data})
+        except Exception as e:
+            # Push is best effort; clients still have the REST endpoints.
+            logger.warning("Falha ao publicar evento %s: %s", event_type, e)
+
+    async def _deliver(self, user_id: str, event: dict) -> None:
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # Slow consumer: drop rather than grow without bound.
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "broker": type(self.broker).__name__,
+            "connected_users": len(self._subscribers),
+            "connections": sum(len(q) for q in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+if EVENT_BROKER not in EVENT_BROKERS:
+    raise RuntimeError(
+        f"EVENT_BROKER inválido: {EVENT_BROKER!r}. Opções: {', '.join(sorted(EVENT_BROKERS))}"
+    )
+event_hub = EventHub(EVENT_BROKERS[EVENT_BROKER](), EVENT_QUEUE_SIZE)
+
+async def insert_notifications(notifications: List[dict]) -> None:
+    if not notifications:
+        return
+    # insert_* adds Mongo's _id to the dicts; publish clean copies.
+    payloads = [dict(n) for n in notifications]
+    if len(notifications) == 1:
+        await db.notifications.insert_one(notifications[0])
+    else:
+        await db.notifications.insert_many(notifications, ordered=False)
+    for payload in payloads:
+        await event_hub.publish(payload["user_id"], "notification", payload)
+
+async def create_notification(
+    user_id: str,
+    title: str,
+    message: str,
+    type: str = "info",
+    created_at: Optional[str] = None
+) -> None:
+    await insert_notifications([{
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "title": title,
+        "message": message,
+        "type": type,
+        "read": False,
+        "created_at": created_at or datetime.now(timezone.utc).isoformat()
+    }])
+
+@api_router.websocket("/ws")
+async def events_websocket(websocket: WebSocket):
+    # The JWT comes as the first message so it stays out of access logs
+    await websocket.accept()
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), timeout=EVENT_AUTH_TIMEOUT_SECONDS)
+        if not isinstance(message, dict) or message.get("type") != "auth" or not isinstance(message.get("token"), str):
+            raise HTTPException(status_code=401, detail="Token inválido")
+        user = await resolve_user_from_token(message["token"])
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, ValueError):
+        await websocket.close(code=4401)
+        return
+    except HTTPException as e:
+        await websocket.close(code=4000 + e.status_code)
+        return
+
+    queue = event_hub.subscribe(user["id"])
+
+    async def forward_events():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def wait_for_disconnect():
+        # Incoming frames are only keep-alives; returning ends the connection.
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(forward_events()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_hub.unsubscribe(user["id"], queue)
+
+# ==================== CONDITIONAL GET ====================
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(json.dumps(parts, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:24]}"'
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def latest_timestamp(values: Iterable[Optional[str]]) -> Optional[datetime]:
+    moments = [moment for moment in map(parse_timestamp, values) if moment]
+    return max(moments) if moments else None
+
+def cache_validators(
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    cache_control: str = "private, no-cache"
+) -> Dict[str, str]:
+    # no-cache: clients keep the body but must revalidate it every time,
+    # which is a bodyless 304 while nothing changed
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+# If-None-Match wins over If-Modified-Since
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = headers["ETag"].removeprefix("W/")
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return any(tag == "*" or tag.removeprefix("W/") == etag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+def has_cache_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+CATALOG_SYSTEM_SCOPE = "system"
+
+async def get_catalog_revisions(personal_id: Optional[str]) -> tuple:
+    scopes = [CATALOG_SYSTEM_SCOPE] + ([personal_id] if personal_id else [])
+    docs = await db.catalog_revisions.find({"scope": {"$in": scopes}}, {"_id": 0}).to_list(len(scopes))
+    by_scope = {doc["scope"]: doc for doc in docs}
+    return tuple(
+        (scope, by_scope.get(scope, {}).get("revision", 0), by_scope.get(scope, {}).get("updated_at"))
+        for scope in scopes
+    )
+
+def catalog_validity_window() -> str:
+    # Edits made outside the API don't bump the revisions; bound them by the catalog TTL
+    window = max(EXERCISE_CATALOG_TTL_SECONDS, 1)
+    return datetime.fromtimestamp(time.time() // window * window, timezone.utc).isoformat()
+
+# Call after every exercise_library write (None for system entries)
+async def bump_catalog_revision(personal_id: Optional[str]) -> None:
+    await db.catalog_revisions.update_one(
+        {"scope": personal_id or CATALOG_SYSTEM_SCOPE},
+        {"$inc": {"revision": 1}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    exercise_catalogs.invalidate(personal_id)
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=RegisterResponse)
@@ -559,8 +1213,9 @@ async def register(user: UserCreate):
     user_doc = {
         "id": user_id,
         "email": user.email,
+        "email_lower": normalize_email(user.email),
         "name": user.name,
-        "password": hash_password(user.password),
+        "password": await password_hasher.hash(user.password),
         "role": "personal",
         "is_approved": False,
         "approved_at": None,
@@ -568,19 +1223,20 @@ async def register(user: UserCreate):
         "created_at": now
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email já cadastrado")
     
     admin_user = await db.users.find_one({"role": "administrador"}, {"_id": 0, "id": 1})
     if admin_user:
-        await db.notifications.insert_one({
-            "id": str(uuid.uuid4()),
-            "user_id": admin_user["id"],
-            "title": "Novo personal pendente",
-            "message": f"Personal '{user.name}' aguardando aprovacao.",
-            "type": "info",
-            "read": False,
-            "created_at": now
-        })
+        await create_notification(
+            admin_user["id"],
+            "Novo personal pendente",
+            f"Personal '{user.name}' aguardando aprovacao.",
+            type="info",
+            created_at=now
+        )
 
     return RegisterResponse(
         message="Cadastro enviado. Aguarde aprovacao do administrador para acessar o sistema.",
@@ -598,7 +1254,7 @@ async def register(user: UserCreate):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await find_user_by_email(credentials.email, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await password_hasher.verify(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
     if user.get("role") == "personal" and user.get("is_approved", True) is not True:
         raise HTTPException(status_code=403, detail="Conta de personal aguardando aprovacao do administrador")
@@ -676,16 +1332,15 @@ async def approve_personal_account(personal_id: str, admin: dict = Depends(get_a
         {"id": personal_id},
         {"$set": {"is_approved": True, "approved_at": now, "approved_by": admin["id"]}}
     )
+    user_cache.invalidate(personal_id)
 
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": personal_id,
-        "title": "Conta aprovada",
-        "message": "Seu acesso de personal foi aprovado pelo administrador.",
-        "type": "info",
-        "read": False,
-        "created_at": now
-    })
+    await create_notification(
+        personal_id,
+        "Conta aprovada",
+        "Seu acesso de personal foi aprovado pelo administrador.",
+        type="info",
+        created_at=now
+    )
 
     updated = await db.users.find_one({"id": personal_id}, {"_id": 0, "password": 0})
     return UserResponse(
@@ -708,6 +1363,20 @@ async def approve_personal_account(personal_id: str, admin: dict = Depends(get_a
         created_at=updated["created_at"]
     )
 
+@api_router.get("/admin/metrics")
+async def get_admin_metrics(admin: dict = Depends(get_admin_user)):
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "email_backfill": email_backfill_state,
+        "library_search_backfill": library_search_backfill_state,
+        "overdue_sweep": overdue_sweep_state,
+        "realtime": event_hub.stats(),
+        "gamification_backfill": gamification_backfill_state,
+        "sheet_parsing": sheet_parser_pool.stats(),
+        "exercise_catalogs": exercise_catalogs.stats()
+    }
+
 # ==================== STUDENT MANAGEMENT ====================
 
 @api_router.post("/students", response_model=UserResponse)
@@ -722,8 +1391,9 @@ async def create_student(student: StudentCreate, personal: dict = Depends(get_pe
     student_doc = {
         "id": student_id,
         "email": student.email,
+        "email_lower": normalize_email(student.email),
         "name": student.name,
-        "password": hash_password(student.password),
+        "password": await password_hasher.hash(student.password),
         "role": "student",
         "personal_id": personal["id"],
         "phone": student.phone,
@@ -737,17 +1407,22 @@ async def create_student(student: StudentCreate, personal: dict = Depends(get_pe
         "created_at": now
     }
     
-    await db.users.insert_one(student_doc)
+    try:
+        await db.users.insert_one(student_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email já cadastrado")
     
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": student_id,
-        "title": "Bem-vindo!",
-        "message": f"Você foi cadastrado por {personal['name']}. Aguarde seu treino!",
-        "type": "info",
-        "read": False,
-        "created_at": now
-    })
+    await db.leaderboard.insert_one(new_leaderboard_entry(student_doc))
+    await db.activity.insert_one({"student_id": student_id, "words": {}, "complete": True})
+    await db.progress_rollup_status.insert_one({"student_id": student_id, "complete": True, "rebuilt_at": now})
+    
+    await create_notification(
+        student_id,
+        "Bem-vindo!",
+        f"Você foi cadastrado por {personal['name']}. Aguarde seu treino!",
+        type="info",
+        created_at=now
+    )
     
     return UserResponse(
         id=student_id,
@@ -827,6 +1502,9 @@ async def update_student(student_id: str, update: StudentUpdate, personal: dict
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_data:
         await db.users.update_one({"id": student_id}, {"$set": update_data})
+        user_cache.invalidate(student_id)
+        if "name" in update_data:
+            await db.leaderboard.update_one({"student_id": student_id}, {"$set": {"student_name": update_data["name"]}})
     
     updated = await db.users.find_one({"id": student_id}, {"_id": 0, "password": 0})
     return UserResponse(
@@ -853,6 +1531,7 @@ async def delete_student(student_id: str, personal: dict = Depends(get_personal_
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    user_cache.invalidate(student_id)
     
     await db.workouts.delete_many({"student_id": student_id})
     await db.progress.delete_many({"student_id": student_id})
@@ -864,6 +1543,13 @@ async def delete_student(student_id: str, personal: dict = Depends(get_personal_
     await db.checkins.delete_many({"student_id": student_id})
     await db.evolution_photos.delete_many({"student_id": student_id})
     await db.workout_sessions.delete_many({"student_id": student_id})
+    await db.conversations.delete_many({"participants": student_id})
+    await db.gamification.delete_one({"student_id": student_id})
+    await db.leaderboard.delete_one({"student_id": student_id})
+    await db.activity.delete_one({"student_id": student_id})
+    await db.progress_daily.delete_many({"student_id": student_id})
+    await db.progress_rollup_status.delete_one({"student_id": student_id})
+    await db.session_accumulators.delete_many({"student_id": student_id})
     
     return {"message": "Aluno removido com sucesso"}
 
@@ -895,15 +1581,13 @@ async def create_assessment(assessment: PhysicalAssessmentCreate, personal: dict
     
     await db.assessments.insert_one(assessment_doc)
     
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": assessment.student_id,
-        "title": "Nova Avaliação Física",
-        "message": f"Uma nova avaliação foi registrada em {assessment.date}",
-        "type": "info",
-        "read": False,
-        "created_at": now
-    })
+    await create_notification(
+        assessment.student_id,
+        "Nova Avaliação Física",
+        f"Uma nova avaliação foi registrada em {assessment.date}",
+        type="info",
+        created_at=now
+    )
     
     return PhysicalAssessmentResponse(**assessment_doc)
 
@@ -988,6 +1672,15 @@ async def compare_assessments(student_id: str, current_user: dict = Depends(get_
 
 # ==================== TRAINING ROUTINES ====================
 
+async def count_workouts_by_routine(routine_ids: List[str]) -> Dict[str, int]:
+    if not routine_ids:
+        return {}
+    pipeline = [
+        {"$match": {"routine_id": {"$in": routine_ids}}},
+        {"$group": {"_id": "$routine_id", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] async for row in db.workouts.aggregate(pipeline)}
+
 @api_router.post("/routines", response_model=TrainingRoutineResponse)
 async def create_routine(routine: TrainingRoutineCreate, personal: dict = Depends(get_personal_user)):
     student = await db.users.find_one({"id": routine.student_id, "personal_id": personal["id"]})
@@ -1009,15 +1702,13 @@ async def create_routine(routine: TrainingRoutineCreate, personal: dict = Depend
     
     await db.routines.insert_one(routine_doc)
     
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": routine.student_id,
-        "title": "Nova Rotina de Treino",
-        "message": f"Uma nova rotina '{routine.name}' foi criada para você!",
-        "type": "workout",
-        "read": False,
-        "created_at": now
-    })
+    await create_notification(
+        routine.student_id,
+        "Nova Rotina de Treino",
+        f"Uma nova rotina '{routine.name}' foi criada para você!",
+        type="workout",
+        created_at=now
+    )
     
     return TrainingRoutineResponse(**routine_doc, workouts_count=0)
 
@@ -1040,13 +1731,9 @@ async def list_routines(
         query["status"] = status
     
     routines = await db.routines.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    counts = await count_workouts_by_routine([r["id"] for r in routines])
     
-    result = []
-    for r in routines:
-        workouts_count = await db.workouts.count_documents({"routine_id": r["id"]})
-        result.append(TrainingRoutineResponse(**r, workouts_count=workouts_count))
-    
-    return result
+    return [TrainingRoutineResponse(**r, workouts_count=counts.get(r["id"], 0)) for r in routines]
 
 @api_router.get("/routines/{routine_id}", response_model=TrainingRoutineResponse)
 async def get_routine(routine_id: str, current_user: dict = Depends(get_current_user)):
@@ -1060,8 +1747,8 @@ async def get_routine(routine_id: str, current_user: dict = Depends(get_current_
     if not routine:
         raise HTTPException(status_code=404, detail="Rotina não encontrada")
     
-    workouts_count = await db.workouts.count_documents({"routine_id": routine_id})
-    return TrainingRoutineResponse(**routine, workouts_count=workouts_count)
+    counts = await count_workouts_by_routine([routine_id])
+    return TrainingRoutineResponse(**routine, workouts_count=counts.get(routine_id, 0))
 
 @api_router.put("/routines/{routine_id}", response_model=TrainingRoutineResponse)
 async def update_routine(routine_id: str, update: TrainingRoutineUpdate, personal: dict = Depends(get_personal_user)):
@@ -1075,8 +1762,8 @@ async def update_routine(routine_id: str, update: TrainingRoutineUpdate, persona
     await db.routines.update_one({"id": routine_id}, {"$set": update_data})
     
     updated = await db.routines.find_one({"id": routine_id}, {"_id": 0})
-    workouts_count = await db.workouts.count_documents({"routine_id": routine_id})
-    return TrainingRoutineResponse(**updated, workouts_count=workouts_count)
+    counts = await count_workouts_by_routine([routine_id])
+    return TrainingRoutineResponse(**updated, workouts_count=counts.get(routine_id, 0))
 
 @api_router.post("/routines/{routine_id}/clone")
 async def clone_routine(routine_id: str, student_id: str, personal: dict = Depends(get_personal_user)):
@@ -1130,8 +1817,323 @@ async def delete_routine(routine_id: str, personal: dict = Depends(get_personal_
 
 # ==================== EXERCISE LIBRARY ====================
 
+def exercise_search_tokens(*texts: Optional[str]) -> List[str]:
+    tokens = set()
+    for text in texts:
+        tokens.update(re.findall(r"[a-z0-9]+", normalize_exercise_name(text)))
+    return sorted(tokens)
+
+def library_search_tokens(exercise: dict) -> List[str]:
+    return exercise_search_tokens(
+        exercise.get("name"), exercise.get("description"), *(exercise.get("muscles_worked") or [])
+    )
+
+library_search_backfill_state: Dict[str, Any] = {"done": False, "updated": 0}
+
+# Every query word must prefix a normalized name, description or muscle token
+def library_search_filter(search: str) -> Optional[dict]:
+    terms = exercise_search_tokens(search)
+    if not terms:
+        return None
+    match = {"$and": [{"search_tokens": {"$regex": f"^{re.escape(term)}"}} for term in terms]}
+    if library_search_backfill_state["done"]:
+        return match
+    # Exercises created before search_tokens existed are found by the old
+    # scan until the startup backfill has reached them.
+    legacy = {"search_tokens": {"$exists": False}, "name": {"$regex": re.escape(search.strip()), "$options": "i"}}
+    return {"$or": [match, legacy]}
+
+# Letters that normalize_exercise_name folds accented variants into
+ACCENT_VARIANTS = {"a": "aáàâãä", "e": "eéèêë", "i": "iíìîï", "o": "oóòôõö", "u": "uúùûü", "c": "cç", "n": "nñ"}
+
+def library_name_prefix_filter(search: str) -> dict:
+    # Names that normalize to something starting with the query: the exact
+    # and prefix matches library_search_rank puts first
+    pattern = "".join(
+        r"\s+" if ch == " "
+        else f"[{ACCENT_VARIANTS[ch]}{ACCENT_VARIANTS[ch].upper()}]" if ch in ACCENT_VARIANTS
+        else re.escape(ch)
+        for ch in normalize_exercise_name(search)
+    )
+    return {"name": {"$regex": f"^\\s*{pattern}", "$options": "i"}}
+
+def library_search_rank(exercise: dict, search: str) -> tuple:
+    query = normalize_exercise_name(search)
+    name = normalize_exercise_name(exercise.get("name"))
+    if name == query:
+        rank = 0
+    elif name.startswith(query):
+        rank = 1
+    else:
+        name_tokens = exercise_search_tokens(name)
+        terms = exercise_search_tokens(query)
+        rank = 2 if all(any(token.startswith(term) for token in name_tokens) for term in terms) else 3
+    return rank, name
+
+async def backfill_library_search_tokens(batch_size: int = LIBRARY_SEARCH_BACKFILL_BATCH_SIZE):
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"search_tokens": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.exercise_library.find(
+            query, {"_id": 1, "name": 1, "description": 1, "muscles_worked": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        result = await db.exercise_library.bulk_write([
+            UpdateOne({"_id": e["_id"]}, {"$set": {"search_tokens": library_search_tokens(e)}})
+            for e in batch
+        ], ordered=False)
+        library_search_backfill_state["updated"] += result.modified_count
+        await asyncio.sleep(0)
+    library_search_backfill_state["done"] = True
+    logger.info("Backfill de search_tokens concluido: %s exercícios atualizados", library_search_backfill_state["updated"])
+
+# Query words shorter than this only match exactly or as a prefix
+EXERCISE_SEARCH_FUZZY_MIN_LENGTH = 4
+
+def fuzzy_search_keys(token: str) -> set:
+    # The token and its one-character deletions: words within one edit of
+    # each other always share one of these keys
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+# Ranked exact name > name prefix > word prefixes > one typo, then by name
+class ExerciseSearchIndex:
+
+    def __init__(self, items: List[dict], base: Optional["ExerciseSearchIndex"] = None):
+        self._base = base
+        self.items = items
+        self._names = [normalize_exercise_name(item["name"]) for item in items]
+        self._name_set = set(self._names)
+        postings: Dict[str, List[int]] = {}
+        for idx, item in enumerate(items):
+            for token in exercise_search_tokens(item["name"], *(item.get("muscles_worked") or [])):
+                postings.setdefault(token, []).append(idx)
+        # Sorted vocabulary: the tokens starting with a prefix are a bisect range
+        self._tokens = sorted(postings)
+        self._postings = [postings[token] for token in self._tokens]
+        self._fuzzy: Dict[str, List[int]] = {}
+        for position, token in enumerate(self._tokens):
+            if len(token) >= EXERCISE_SEARCH_FUZZY_MIN_LENGTH:
+                for key in fuzzy_search_keys(token):
+                    self._fuzzy.setdefault(key, []).append(position)
+
+    def _items_for(self, positions: Iterable[int]) -> set:
+        found = set()
+        for position in positions:
+            found.update(self._postings[position])
+        return found
+
+    def _prefix_matches(self, term: str) -> set:
+        start = bisect.bisect_left(self._tokens, term)
+        end = bisect.bisect_left(self._tokens, term + "\uffff")
+        return self._items_for(range(start, end))
+
+    def _fuzzy_matches(self, term: str) -> set:
+        if len(term) < EXERCISE_SEARCH_FUZZY_MIN_LENGTH:
+            return set()
+        return self._items_for({
+            position for key in fuzzy_search_keys(term) for position in self._fuzzy.get(key, ())
+        })
+
+    def _matches(self, text: str, terms: List[str]) -> Dict[str, tuple]:
+        # Normalized name -> (rank, name, item), this layer over its base
+        found: Dict[str, tuple] = {}
+        if self._base is not None:
+            found = {
+                name: match for name, match in self._base._matches(text, terms).items()
+                if name not in self._name_set
+            }
+
+        token_hits: Optional[set] = None
+        loose_hits: Optional[set] = None
+        for term in terms:
+            prefix = self._prefix_matches(term)
+            token_hits = prefix if token_hits is None else token_hits & prefix
+            loose = prefix | self._fuzzy_matches(term)
+            loose_hits = loose if loose_hits is None else loose_hits & loose
+
+        for idx in loose_hits:
+            name = self._names[idx]
+            if idx not in token_hits:
+                rank = 3
+            elif name == text:
+                rank = 0
+            elif name.startswith(text):
+                rank = 1
+            else:
+                rank = 2
+            found[name] = (rank, name, self.items[idx])
+        return found
+
+    def search(self, query: str, category: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+        terms = exercise_search_tokens(query)
+        if not terms:
+            return {"results": [], "total": 0, "facets": {"category": []}}
+        ranked = list(self._matches(normalize_exercise_name(query), terms).values())
+
+        facets: Dict[str, int] = {}
+        for _, _, item in ranked:
+            item_category = item.get("category")
+            if item_category:
+                facets[item_category] = facets.get(item_category, 0) + 1
+        if category:
+            ranked = [entry for entry in ranked if entry[2].get("category") == category]
+        ranked.sort(key=lambda entry: entry[:2])
+
+        return {
+            "results": [item for _, _, item in ranked[:limit]],
+            "total": len(ranked),
+            "facets": {
+                "category": [
+                    {"value": value, "count": count}
+                    for value, count in sorted(facets.items(), key=lambda f: (-f[1], f[0]))
+                ]
+            },
+        }
+
+BUILTIN_EXERCISE_SEARCH_INDEX = ExerciseSearchIndex([
+    {
+        "id": None,
+        "name": name.title(),
+        "category": None,
+        "image_url": image_url,
+        "video_url": EXERCISE_VIDEO_MATCHER.lookup(name),
+        "muscles_worked": None,
+        "source": "catalog",
+    }
+    for name, image_url in BUILTIN_IMAGE_ENTRIES
+])
+
+class ExerciseCatalog:
+
+    def __init__(self, library: List[dict], base: Optional["ExerciseCatalog"] = None):
+        self.images = ExerciseNameMatcher(
+            [(e["name"], e.get("image_url")) for e in library],
+            cache_size=1024, base=base.images if base else EXERCISE_IMAGE_MATCHER
+        )
+        self.videos = ExerciseNameMatcher(
+            [(e["name"], normalize_youtube_url(e.get("video_url"))) for e in library],
+            cache_size=1024, base=base.videos if base else EXERCISE_VIDEO_MATCHER
+        )
+
+        items: Dict[str, dict] = {}
+        for exercise in library:
+            items[normalize_exercise_name(exercise["name"])] = {
+                "id": exercise.get("id"),
+                "name": exercise["name"],
+                "category": exercise.get("category"),
+                "image_url": exercise.get("image_url"),
+                "video_url": normalize_youtube_url(exercise.get("video_url")),
+                "muscles_worked": exercise.get("muscles_worked"),
+                "source": "personal" if exercise.get("personal_id") else "system",
+            }
+        self.search_index = ExerciseSearchIndex(
+            list(items.values()), base=base.search_index if base else BUILTIN_EXERCISE_SEARCH_INDEX
+        )
+
+EXERCISE_CATALOG_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "category": 1, "image_url": 1, "video_url": 1, "muscles_worked": 1, "personal_id": 1
+}
+
+# One shared layer for the system library plus one per personal with only their own entries
+class ExerciseCatalogCache:
+
+    def __init__(self, ttl_seconds: float, max_entries: int, revision_check_seconds: float = 1.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.revision_check_seconds = revision_check_seconds
+        self._system: Optional[tuple] = None
+        self._entries: "OrderedDict[Optional[str], tuple]" = OrderedDict()
+        self._build_lock = asyncio.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.builds = 0
+        self.invalidations = 0
+        self.revision_checks = 0
+
+    async def _system_catalog(self, revision: int, generation: int) -> ExerciseCatalog:
+        now = time.monotonic()
+        if self._system is not None and self._system[0] > now and self._system[1] == revision:
+            return self._system[2]
+        library = await db.exercise_library.find(
+            {"personal_id": None}, EXERCISE_CATALOG_PROJECTION
+        ).sort("created_at", 1).to_list(None)
+        catalog = await asyncio.to_thread(ExerciseCatalog, library)
+        self.builds += 1
+        if self.ttl_seconds > 0 and generation == self._generation:
+            self._system = (time.monotonic() + self.ttl_seconds, revision, catalog)
+        return catalog
+
+    async def get(self, personal_id: Optional[str]) -> ExerciseCatalog:
+        now = time.monotonic()
+        entry = self._entries.get(personal_id)
+        if entry is not None and entry[0] > now and entry[3] > now:
+            self._entries.move_to_end(personal_id)
+            self.hits += 1
+            return entry[2]
+
+        generation = self._generation
+        revisions = [revision for _, revision, _ in await get_catalog_revisions(personal_id)]
+        self.revision_checks += 1
+        entry = self._entries.get(personal_id)
+        if entry is not None and entry[0] > now and entry[1] == revisions:
+            self._entries[personal_id] = (entry[0], revisions, entry[2], now + self.revision_check_seconds)
+            self._entries.move_to_end(personal_id)
+            self.hits += 1
+            return entry[2]
+
+        # One build at a time, so a system change is rebuilt once rather than
+        # once per personal waiting on it
+        async with self._build_lock:
+            catalog = await self._system_catalog(revisions[0], generation)
+            if personal_id:
+                library = await db.exercise_library.find(
+                    {"personal_id": personal_id}, EXERCISE_CATALOG_PROJECTION
+                ).sort("created_at", 1).to_list(None)
+                catalog = await asyncio.to_thread(ExerciseCatalog, library, catalog)
+                self.builds += 1
+        # Skip caching if the library changed while it was being read
+        if self.ttl_seconds > 0 and generation == self._generation:
+            now = time.monotonic()
+            self._entries[personal_id] = (now + self.ttl_seconds, revisions, catalog, now + self.revision_check_seconds)
+            self._entries.move_to_end(personal_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return catalog
+
+    def invalidate(self, personal_id: Optional[str] = None) -> None:
+        self._generation += 1
+        if personal_id is None:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._system = None
+        elif self._entries.pop(personal_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "builds": self.builds,
+            "invalidations": self.invalidations,
+            "revision_checks": self.revision_checks,
+        }
+
+exercise_catalogs = ExerciseCatalogCache(EXERCISE_CATALOG_TTL_SECONDS, EXERCISE_CATALOG_MAX_ENTRIES)
+
+EXERCISE_CATEGORIES_ETAG = make_etag("exercise-categories", EXERCISE_CATEGORIES)
+
 @api_router.get("/exercise-library/categories")
-async def get_exercise_categories():
+async def get_exercise_categories(request: Request, response: Response):
+    headers = {"ETag": EXERCISE_CATEGORIES_ETAG, "Cache-Control": "public, max-age=3600"}
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    response.headers.update(headers)
     return {"categories": EXERCISE_CATEGORIES}
 
 @api_router.post("/exercise-library", response_model=ExerciseLibraryResponse)
@@ -1140,7 +2142,9 @@ async def create_library_exercise(exercise: ExerciseLibraryCreate, personal: dic
     now = datetime.now(timezone.utc).isoformat()
     
     # Get default image if not provided
-    image_url = exercise.image_url or get_exercise_image(exercise.name)
+    image_url = exercise.image_url
+    if not image_url:
+        image_url = (await exercise_catalogs.get(personal["id"])).images.lookup(exercise.name)
     
     exercise_doc = {
         "id": exercise_id,
@@ -1149,31 +2153,62 @@ async def create_library_exercise(exercise: ExerciseLibraryCreate, personal: dic
         "personal_id": personal["id"],
         "created_at": now
     }
+    exercise_doc["search_tokens"] = library_search_tokens(exercise_doc)
     
     await db.exercise_library.insert_one(exercise_doc)
+    await bump_catalog_revision(personal["id"])
     return ExerciseLibraryResponse(**exercise_doc)
 
 @api_router.get("/exercise-library", response_model=List[ExerciseLibraryResponse])
 async def list_library_exercises(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     search: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    personal_id = current_user["id"] if current_user["role"] == "personal" else current_user.get("personal_id")
+    # API writes to the library bump the revisions; other changes are picked
+    # up when the validity window rolls over
+    revisions = await get_catalog_revisions(personal_id)
+    window = catalog_validity_window()
+    headers = cache_validators(
+        make_etag("exercise-library", revisions, window, category, search, library_search_backfill_state["done"]),
+        latest_timestamp([window, *(updated_at for _, _, updated_at in revisions)])
+    )
+    if is_not_modified(request, headers):
+        return not_modified_response(headers)
+    response.headers.update(headers)
+
     # Get system exercises and personal's custom exercises
     query = {
         "$or": [
             {"personal_id": None},
-            {"personal_id": current_user["id"] if current_user["role"] == "personal" else current_user.get("personal_id")}
+            {"personal_id": personal_id}
         ]
     }
     
     if category:
         query["category"] = category
     
-    if search:
-        query["name"] = {"$regex": search, "$options": "i"}
-    
-    exercises = await db.exercise_library.find(query, {"_id": 0}).sort("name", 1).to_list(500)
+    search_filter = library_search_filter(search) if search else None
+    if search_filter:
+        query["$and"] = [search_filter]
+    
+    projection = {"_id": 0, "search_tokens": 0}
+    if search_filter:
+        # Exact and prefix name matches are fetched on their own, so they
+        # aren't cut off by the cap when they sort late by name
+        prefix_query = {**query, "$and": [search_filter, library_name_prefix_filter(search)]}
+        prefix_matches, matches = await asyncio.gather(
+            db.exercise_library.find(prefix_query, projection).sort("name", 1).to_list(500),
+            db.exercise_library.find(query, projection).sort("name", 1).to_list(500),
+        )
+        exercises = list({e["id"]: e for e in prefix_matches + matches}.values())
+        exercises.sort(key=lambda e: library_search_rank(e, search))
+        exercises = exercises[:500]
+    else:
+        exercises = await db.exercise_library.find(query, projection).sort("name", 1).to_list(500)
     return [ExerciseLibraryResponse(**e) for e in exercises]
 
 @api_router.delete("/exercise-library/{exercise_id}")
@@ -1181,6 +2216,7 @@ async def delete_library_exercise(exercise_id: str, personal: dict = Depends(get
     result = await db.exercise_library.delete_one({"id": exercise_id, "personal_id": personal["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Exercício não encontrado ou é um exercício do sistema")
+    await bump_catalog_revision(personal["id"])
     return {"message": "Exercício removido com sucesso"}
 
 # ==================== FINANCIAL ====================
@@ -1202,7 +2238,10 @@ async def create_financial_plan(plan: FinancialPlanCreate, personal: dict = Depe
     }
     
     await db.plans.insert_one(plan_doc)
-    return {"id": plan_id, **plan_doc}
+    
+    # Remove _id from response
+    plan_doc.pop("_id", None)
+    return plan_doc
 
 @api_router.get("/financial/plans")
 async def list_financial_plans(
@@ -1289,10 +2328,69 @@ async def delete_payment(payment_id: str, personal: dict = Depends(get_personal_
         raise HTTPException(status_code=404, detail="Pagamento não encontrado")
     return {"message": "Pagamento removido com sucesso"}
 
+PAYMENT_BREAKDOWN_KEYS = {
+    "month": {"$substrCP": ["$due_date", 0, 7]},
+    "student": "$student_id",
+    "method": "$payment_method",
+}
+
+PAYMENT_STATUS_GROUP = {"total": {"$sum": "$amount"}, "count": {"$sum": 1}}
+
+def build_payment_summary(by_status: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    def total(status: str):
+        return by_status.get(status, {}).get("total", 0)
+
+    def count(status: str) -> int:
+        return by_status.get(status, {}).get("count", 0)
+
+    return {
+        "total_received": total("paid"),
+        "total_pending": total("pending"),
+        "total_overdue": total("overdue"),
+        "payments_count": sum(row.get("count", 0) for row in by_status.values()),
+        "paid_count": count("paid"),
+        "pending_count": count("pending"),
+        "overdue_count": count("overdue")
+    }
+
+async def aggregate_payment_totals(match: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$status", **PAYMENT_STATUS_GROUP}}
+    ]
+    return {row["_id"]: row async for row in db.payments.aggregate(pipeline)}
+
+async def aggregate_payment_breakdown(match: Dict[str, Any], group_by: str):
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            "by_status": [
+                {"$group": {"_id": "$status", **PAYMENT_STATUS_GROUP}}
+            ],
+            "breakdown": [
+                {"$group": {"_id": {"key": PAYMENT_BREAKDOWN_KEYS[group_by], "status": "$status"}, **PAYMENT_STATUS_GROUP}}
+            ]
+        }}
+    ]
+    result = await db.payments.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {"by_status": [], "breakdown": []}
+
+    by_status = {row["_id"]: row for row in facets["by_status"]}
+    grouped: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+    for row in facets["breakdown"]:
+        grouped.setdefault(row["_id"].get("key"), {})[row["_id"].get("status")] = row
+
+    breakdown = [
+        {"key": key, **build_payment_summary(statuses)}
+        for key, statuses in sorted(grouped.items(), key=lambda item: (item[0] is None, str(item[0])))
+    ]
+    return by_status, breakdown
+
 @api_router.get("/financial/summary")
 async def get_financial_summary(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    group_by: Optional[str] = Query(None, pattern="^(month|student|method)$"),
     personal: dict = Depends(get_personal_user)
 ):
     query = {"personal_id": personal["id"]}
@@ -1304,22 +2402,185 @@ async def get_financial_summary(
         if end_date:
             query["due_date"]["$lte"] = end_date
     
-    payments = await db.payments.find(query, {"_id": 0}).to_list(1000)
-    
-    total_received = sum(p["amount"] for p in payments if p["status"] == "paid")
-    total_pending = sum(p["amount"] for p in payments if p["status"] == "pending")
-    total_overdue = sum(p["amount"] for p in payments if p["status"] == "overdue")
+    if not group_by:
+        return build_payment_summary(await aggregate_payment_totals(query))
     
+    by_status, breakdown = await aggregate_payment_breakdown(query, group_by)
     return {
-        "total_received": total_received,
-        "total_pending": total_pending,
-        "total_overdue": total_overdue,
-        "payments_count": len(payments),
-        "paid_count": len([p for p in payments if p["status"] == "paid"]),
-        "pending_count": len([p for p in payments if p["status"] == "pending"]),
-        "overdue_count": len([p for p in payments if p["status"] == "overdue"])
+        **build_payment_summary(by_status),
+        "group_by": group_by,
+        "breakdown": breakdown
+    }
+
+def current_billing_period() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+# Billing cycle of plans created without duration_months, by a word of the name
+PLAN_NAME_DURATION_MONTHS = {"mensal": 1, "bimestral": 2, "trimestral": 3, "quadrimestral": 4, "semestral": 6, "anual": 12}
+
+def plan_duration_months(plan: dict) -> int:
+    if plan.get("duration_months"):
+        return plan["duration_months"]
+    for word in str(plan.get("name") or "").lower().split():
+        if word in PLAN_NAME_DURATION_MONTHS:
+            return PLAN_NAME_DURATION_MONTHS[word]
+    return 1
+
+def period_month_index(period: str) -> int:
+    year, month = (int(part) for part in period[:7].split("-"))
+    return year * 12 + month - 1
+
+# Billing cycles count from the plan's start month
+def plan_billing_period(plan: dict, period: str) -> str:
+    try:
+        anchor = period_month_index(plan["start_date"])
+    except (KeyError, TypeError, ValueError):
+        anchor = 0
+    index = period_month_index(period)
+    start = index - (index - anchor) % plan_duration_months(plan)
+    return f"{start // 12:04d}-{start % 12 + 1:02d}"
+
+def billing_due_date(period: str, due_day: int) -> str:
+    year, month = (int(part) for part in period.split("-"))
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(max(due_day, 1), last_day)).isoformat()
+
+# Idempotent per (plan_id, cycle start), backed by the unique payments index
+async def generate_billing_for_period(
+    period: str,
+    personal_id: Optional[str] = None,
+    student_id: Optional[str] = None
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"status": "active"}
+    if personal_id:
+        query["personal_id"] = personal_id
+    if student_id:
+        query["student_id"] = student_id
+
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    plans_considered = 0
+    async for plan in db.plans.find(query, {"_id": 0}):
+        if (plan.get("start_date") or "")[:7] > period:
+            continue
+        plans_considered += 1
+        plan_period = plan_billing_period(plan, period)
+        payment_doc = {
+            "id": str(uuid.uuid4()),
+            "personal_id": plan["personal_id"],
+            "student_id": plan["student_id"],
+            "plan_id": plan["id"],
+            "amount": plan["value"],
+            "due_date": billing_due_date(plan_period, plan["due_day"]),
+            "payment_date": None,
+            "status": "pending",
+            "payment_method": None,
+            "notes": f"{plan['name']} - {plan_period}",
+            "period": plan_period,
+            "created_at": now
+        }
+        operations.append(UpdateOne(
+            {"plan_id": plan["id"], "period": plan_period},
+            {"$setOnInsert": payment_doc},
+            upsert=True
+        ))
+
+    created = 0
+    for start in range(0, len(operations), BILLING_BULK_BATCH_SIZE):
+        batch = operations[start:start + BILLING_BULK_BATCH_SIZE]
+        try:
+            result = await db.payments.bulk_write(batch, ordered=False)
+            created += result.upserted_count
+        except BulkWriteError as e:
+            # A concurrent run inserted the same (plan, period) first.
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            created += e.details.get("nUpserted", 0)
+
+    return {
+        "period": period,
+        "plans_considered": plans_considered,
+        "created": created,
+        "already_billed": plans_considered - created
     }
 
+@api_router.post("/financial/billing/generate")
+async def generate_billing(run: BillingRunCreate, personal: dict = Depends(get_personal_user)):
+    if run.student_id:
+        student = await db.users.find_one({"id": run.student_id, "personal_id": personal["id"]})
+        if not student:
+            raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    
+    return await generate_billing_for_period(run.period or current_billing_period(), personal["id"], run.student_id)
+
+async def run_scheduled_billing():
+    result = await generate_billing_for_period(current_billing_period())
+    if result["created"]:
+        logger.info("Cobrancas geradas para %s: %s", result["period"], result["created"])
+
+overdue_sweep_state: Dict[str, Any] = {
+    "interval_seconds": OVERDUE_SWEEP_INTERVAL_SECONDS,
+    "runs": 0,
+    "last_run_at": None,
+    "last_duration_ms": None,
+    "last_changed": 0,
+    "total_changed": 0
+}
+
+async def sweep_overdue_payments() -> int:
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    sweep_id = str(uuid.uuid4())
+
+    result = await db.payments.update_many(
+        {"status": "pending", "due_date": {"$lt": now.date().isoformat()}},
+        {"$set": {"status": "overdue", "overdue_since": now.isoformat(), "overdue_sweep_id": sweep_id}}
+    )
+
+    if result.modified_count:
+        changed = await db.payments.find(
+            {
+                "overdue_sweep_id": sweep_id,
+                "due_date": {"$gte": (now - timedelta(days=OVERDUE_NOTIFY_WINDOW_DAYS)).date().isoformat()}
+            },
+            {"_id": 0, "student_id": 1, "personal_id": 1, "amount": 1, "due_date": 1}
+        ).to_list(None)
+
+        created_at = now.isoformat()
+        notifications = [{
+            "id": str(uuid.uuid4()),
+            "user_id": p["student_id"],
+            "title": "Pagamento em atraso",
+            "message": f"Seu pagamento de R$ {p['amount']:.2f} venceu em {p['due_date'][:10]}.",
+            "type": "info",
+            "read": False,
+            "created_at": created_at
+        } for p in changed]
+
+        overdue_by_personal: Dict[str, int] = {}
+        for p in changed:
+            overdue_by_personal[p["personal_id"]] = overdue_by_personal.get(p["personal_id"], 0) + 1
+        notifications.extend({
+            "id": str(uuid.uuid4()),
+            "user_id": personal_id,
+            "title": "Pagamentos em atraso",
+            "message": f"{count} pagamento(s) de alunos passaram do vencimento.",
+            "type": "info",
+            "read": False,
+            "created_at": created_at
+        } for personal_id, count in overdue_by_personal.items())
+
+        await insert_notifications(notifications)
+
+    overdue_sweep_state["runs"] += 1
+    overdue_sweep_state["last_run_at"] = now.isoformat()
+    overdue_sweep_state["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    overdue_sweep_state["last_changed"] = result.modified_count
+    overdue_sweep_state["total_changed"] += result.modified_count
+    if result.modified_count:
+        logger.info("Pagamentos marcados como atrasados: %s", result.modified_count)
+    return result.modified_count
+
 @api_router.get("/financial/student/{student_id}")
 async def get_student_financial(
     student_id: str,
@@ -1366,6 +2627,7 @@ async def create_checkin(checkin: CheckInCreate, current_user: dict = Depends(ge
     }
     
     await db.checkins.insert_one(checkin_doc)
+    await on_activity(current_user, [now])
     return CheckInResponse(**checkin_doc)
 
 @api_router.get("/checkins", response_model=List[CheckInResponse])
@@ -1503,71 +2765,139 @@ async def delete_evolution_photo(photo_id: str, personal: dict = Depends(get_per
 
 # ==================== WORKOUT MANAGEMENT ====================
 
-def normalize_sheet_column(name: str) -> str:
-    text = str(name or "").strip().lower()
-    text = unicodedata.normalize("NFKD", text)
-    text = "".join(ch for ch in text if not unicodedata.combining(ch))
-    text = re.sub(r"[^a-z0-9]+", " ", text)
-    return re.sub(r"\s+", " ", text).strip()
-
-def clean_sheet_value(value: Any) -> str:
-    if value is None:
-        return ""
-    try:
-        if pd.isna(value):
-            return ""
-    except TypeError:
-        pass
-    text = str(value).strip()
-    if text.lower() == "nan":
-        return ""
-    return text
-
-def parse_rest_time_seconds(interval_value: Any, default_seconds: int = 90) -> int:
-    text = clean_sheet_value(interval_value).lower()
-    if not text:
-        return default_seconds
-
-    normalized = (
-        text.replace("–", "-")
-        .replace("—", "-")
-        .replace("−", "-")
-        .replace("\x96", "-")
-        .replace(",", ".")
-    )
-
-    matches = re.findall(r"\d+(?:\.\d+)?", normalized)
-    if not matches:
-        return default_seconds
-
-    values = [float(v) for v in matches]
-    base_value = values[0] if len(values) == 1 else (values[0] + values[1]) / 2
-
-    is_minutes = any(token in normalized for token in ["min", "mins", "minute"])
-    if not is_minutes and re.search(r"\d+\s*m\b", normalized):
-        is_minutes = True
-    if not is_minutes and "s" not in normalized and base_value <= 10:
-        is_minutes = True
+# pandas' sheet readers hold the GIL, so sheets parse in spawned worker processes
+class SheetParserPool:
+
+    def __init__(self, workers: int, max_queue: int, timeout_seconds: float):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout_seconds = timeout_seconds
+        self._executor = self._new_executor()
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context("spawn")
+        # Each worker reports its pid here on start, so a stuck one can be killed
+        self._worker_pids = context.SimpleQueue()
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=sheet_parser.report_worker_pid,
+            initargs=(self._worker_pids,)
+        )
 
-    seconds = int(round(base_value * 60)) if is_minutes else int(round(base_value))
-    return seconds if seconds > 0 else default_seconds
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        # A running task can't be cancelled, so its worker is killed; the pool
+        # then reports itself broken and its manager thread reaps the processes
+        if executor is not self._executor:
+            return
+        worker_pids = self._worker_pids
+        self._executor = self._new_executor()
+        while not worker_pids.empty():
+            try:
+                os.kill(worker_pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        worker_pids.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, content: bytes, filename_lower: str) -> List[dict]:
+        for attempt in range(2):
+            executor = self._executor
+            future = asyncio.get_running_loop().run_in_executor(
+                executor, sheet_parser.parse_sheet, content, filename_lower
+            )
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self._recycle(executor)
+                raise
+            except BrokenProcessPool:
+                # Killed because another sheet timed out: run again
+                if attempt == 0 and executor is not self._executor:
+                    continue
+                self._recycle(executor)
+                raise
+
+    async def parse(self, content: bytes, filename_lower: str) -> List[dict]:
+        if self.waiting >= self.max_queue and self._semaphore.locked():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Muitas planilhas em processamento. Tente novamente em instantes."
+            )
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.in_flight += 1
+        try:
+            days = await self._run(content, filename_lower)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=504,
+                detail="A planilha demorou demais para ser processada. Divida o arquivo e tente novamente."
+            )
+        except BrokenProcessPool:
+            self.failed += 1
+            raise HTTPException(status_code=400, detail="Erro ao processar arquivo")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+        elapsed = time.perf_counter() - started_at
+        self.completed += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        return days
+
+    async def warm_up(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, sheet_parser.warm_up)
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.total_seconds / count * 1000, 2),
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
 
-def to_int_or_default(value: Any, default: int = 3) -> int:
-    text = clean_sheet_value(value).replace(",", ".")
-    if not text:
-        return default
-    try:
-        parsed = int(float(text))
-        return parsed if parsed > 0 else default
-    except (TypeError, ValueError):
-        return default
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+sheet_parser_pool = SheetParserPool(SHEET_PARSE_WORKERS, SHEET_PARSE_MAX_QUEUE, SHEET_PARSE_TIMEOUT_SECONDS)
 
-def resolve_sheet_column(normalized_columns: Dict[str, str], aliases: List[str]) -> Optional[str]:
-    for alias in aliases:
-        alias_key = normalize_sheet_column(alias)
-        if alias_key in normalized_columns:
-            return normalized_columns[alias_key]
-    return None
+async def attach_exercise_media(days: List[dict], personal_id: str) -> None:
+    catalog = await exercise_catalogs.get(personal_id)
+    for day in days:
+        for exercise in day["exercises"]:
+            exercise["image_url"] = catalog.images.lookup(exercise["name"])
+            if not exercise["video_url"]:
+                exercise["video_url"] = catalog.videos.lookup(exercise["name"])
 
 @api_router.post("/workouts/upload")
 async def upload_workout(
@@ -1586,105 +2916,19 @@ async def upload_workout(
         if not student:
             raise HTTPException(status_code=404, detail="Aluno não encontrado")
     
-    try:
-        content = await file.read()
-        if filename_lower.endswith(".csv"):
-            try:
-                df = pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="utf-8-sig")
-            except UnicodeDecodeError:
-                try:
-                    df = pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="cp1252")
-                except UnicodeDecodeError:
-                    df = pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="latin-1")
-        else:
-            df = pd.read_excel(BytesIO(content))
-
-        df.columns = [clean_sheet_value(col) for col in df.columns]
-        normalized_columns: Dict[str, str] = {}
-        for col in df.columns:
-            key = normalize_sheet_column(col)
-            if key and key not in normalized_columns:
-                normalized_columns[key] = col
-
-        day_col = resolve_sheet_column(normalized_columns, ["TREINO", "Dia"])
-        exercise_col = resolve_sheet_column(normalized_columns, ["EXERCÍCIO", "Exercicio"])
-        reps_col = resolve_sheet_column(normalized_columns, ["REPETIÇÕES", "Repeticoes", "Reps"])
-
-        missing_required = []
-        if not day_col:
-            missing_required.append("TREINO")
-        if not exercise_col:
-            missing_required.append("EXERCÍCIO")
-        if not reps_col:
-            missing_required.append("REPETIÇÕES")
-
-        if missing_required:
-            found_columns = ", ".join(df.columns.tolist()) or "(nenhuma coluna)"
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Colunas obrigatórias não encontradas: {', '.join(missing_required)}. "
-                    f"Colunas encontradas: {found_columns}"
-                )
-            )
-
-        muscle_col = resolve_sheet_column(normalized_columns, ["GRUPO MUSCULAR", "Grupo Muscular"])
-        sets_col = resolve_sheet_column(normalized_columns, ["SÉRIES", "Series"])
-        weight_col = resolve_sheet_column(normalized_columns, ["CARGA (ALUNO)", "Carga Aluno", "CARGA"])
-        interval_col = resolve_sheet_column(normalized_columns, ["INTERVALO", "Descanso"])
-        notes_col = resolve_sheet_column(normalized_columns, ["OBSERVAÇÃO", "OBSERVAÇÕES", "Observacao", "Observacoes"])
-        method_col = resolve_sheet_column(normalized_columns, ["MÉTODO", "Metodo"])
-        video_col = resolve_sheet_column(normalized_columns, ["VÍDEO", "VIDEO", "Link Vídeo", "Link Video"])
-        description_col = resolve_sheet_column(normalized_columns, ["DESCRIÇÃO", "Descricao"])
-
-        days_map: Dict[str, List[Dict[str, Any]]] = {}
-        for _, row in df.iterrows():
-            day_name = clean_sheet_value(row.get(day_col))
-            exercise_name = clean_sheet_value(row.get(exercise_col))
-
-            # Ignore spacing/placeholder rows from spreadsheet templates.
-            if not day_name or not exercise_name:
-                continue
-
-            reps_value = clean_sheet_value(row.get(reps_col)) or "10-12"
-            interval_value = clean_sheet_value(row.get(interval_col)) if interval_col else ""
-            method_value = clean_sheet_value(row.get(method_col)) if method_col else ""
-            notes_value = clean_sheet_value(row.get(notes_col)) if notes_col else ""
-            description_value = clean_sheet_value(row.get(description_col)) if description_col else ""
-            video_value = clean_sheet_value(row.get(video_col)) if video_col else ""
-
-            description_parts = []
-            if description_value:
-                description_parts.append(description_value)
-            if method_value:
-                description_parts.append(f"Método: {method_value}")
-            if interval_value:
-                description_parts.append(f"Intervalo: {interval_value}")
-            merged_description = " | ".join(description_parts) if description_parts else None
-
-            exercise = {
-                "name": exercise_name,
-                "muscle_group": clean_sheet_value(row.get(muscle_col)) if muscle_col else "",
-                "sets": to_int_or_default(row.get(sets_col), 3) if sets_col else 3,
-                "reps": reps_value,
-                "weight": clean_sheet_value(row.get(weight_col)) if weight_col else None,
-                "notes": notes_value or None,
-                "image_url": get_exercise_image(exercise_name),
-                "video_url": video_value or resolve_exercise_video_url(exercise_name),
-                "description": merged_description,
-                "rest_time": parse_rest_time_seconds(interval_value, default_seconds=90),
-            }
-
-            if not exercise["weight"]:
-                exercise["weight"] = None
-
-            days_map.setdefault(day_name, []).append(exercise)
+    content = await file.read(SHEET_UPLOAD_MAX_BYTES + 1)
+    if len(content) > SHEET_UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Arquivo muito grande. O limite é {SHEET_UPLOAD_MAX_BYTES // (1024 * 1024)} MB"
+        )
 
-        days = [
-            {"day_name": day_name, "exercises": exercises}
-            for day_name, exercises in days_map.items()
-            if exercises
-        ]
+    try:
+        try:
+            days = await sheet_parser_pool.parse(content, filename_lower)
+        except sheet_parser.SheetParseError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await attach_exercise_media(days, personal["id"])
 
         if not days:
             raise HTTPException(
@@ -1722,15 +2966,13 @@ async def upload_workout(
         await db.workouts.insert_one(workout_doc)
         
         if student_id:
-            await db.notifications.insert_one({
-                "id": str(uuid.uuid4()),
-                "user_id": student_id,
-                "title": "Novo Treino!",
-                "message": f"Seu personal atualizou seu treino: {workout_doc['name']}",
-                "type": "workout",
-                "read": False,
-                "created_at": now
-            })
+            await create_notification(
+                student_id,
+                "Novo Treino!",
+                f"Seu personal atualizou seu treino: {workout_doc['name']}",
+                type="workout",
+                created_at=now
+            )
         
         return {
             "id": workout_id,
@@ -1742,8 +2984,6 @@ async def upload_workout(
         
     except HTTPException:
         raise
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="Arquivo vazio ou inválido")
     except Exception as e:
         logger.error(f"Error parsing file: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Erro ao processar arquivo: {str(e)}")
@@ -1783,10 +3023,49 @@ async def create_workout(workout: WorkoutCreate, personal: dict = Depends(get_pe
         version=1
     )
 
-@api_router.get("/workouts", response_model=List[WorkoutResponse])
+WORKOUT_VALIDATOR_PROJECTION = {"_id": 0, "id": 1, "version": 1, "created_at": 1, "updated_at": 1}
+
+# Per-day exercise counts computed by the server, so a summary listing never
+# ships the nested exercises
+WORKOUT_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "student_id": 1,
+    "personal_id": 1,
+    "routine_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "version": 1,
+    "days": {
+        "$map": {
+            "input": {"$ifNull": ["$days", []]},
+            "as": "day",
+            "in": {
+                "day_name": "$$day.day_name",
+                "exercises_count": {"$size": {"$ifNull": ["$$day.exercises", []]}},
+            },
+        }
+    },
+}
+
+def workout_validators(workouts: List[dict], view: str = "full") -> Dict[str, str]:
+    # Every write to a workout sets updated_at, so id + version + updated_at
+    # identifies the body without reading the days
+    return cache_validators(
+        make_etag("workouts", view, [
+            (w["id"], w.get("version", 1), w.get("updated_at", w["created_at"])) for w in workouts
+        ]),
+        latest_timestamp(w.get("updated_at", w["created_at"]) for w in workouts)
+    )
+
+@api_router.get("/workouts", response_model=List[Union[WorkoutSummaryResponse, WorkoutResponse]])
 async def list_workouts(
+    request: Request,
+    response: Response,
     student_id: Optional[str] = None,
     routine_id: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
     current_user: dict = Depends(get_current_user)
 ):
     query = {"archived": {"$ne": True}}
@@ -1801,11 +3080,42 @@ async def list_workouts(
     if routine_id:
         query["routine_id"] = routine_id
     
-    workouts = await db.workouts.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    if has_cache_validators(request):
+        # Check the validators on a light projection before reading the days
+        current = await db.workouts.find(query, WORKOUT_VALIDATOR_PROJECTION).sort("created_at", -1).to_list(100)
+        headers = workout_validators(current, view)
+        if is_not_modified(request, headers):
+            return not_modified_response(headers)
+
+    if view == "summary":
+        workouts = await db.workouts.aggregate([
+            {"$match": query},
+            {"$sort": {"created_at": -1}},
+            {"$limit": 100},
+            {"$project": WORKOUT_SUMMARY_PROJECTION},
+        ]).to_list(100)
+    else:
+        workouts = await db.workouts.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    response.headers.update(workout_validators(workouts, view))
     
     result = []
     for w in workouts:
         try:
+            if view == "summary":
+                result.append(WorkoutSummaryResponse(
+                    id=w["id"],
+                    name=w["name"],
+                    student_id=w.get("student_id") or "",
+                    personal_id=w["personal_id"],
+                    routine_id=w.get("routine_id"),
+                    days=w["days"],
+                    days_count=len(w["days"]),
+                    exercises_count=sum(day["exercises_count"] for day in w["days"]),
+                    created_at=w["created_at"],
+                    updated_at=w.get("updated_at", w["created_at"]),
+                    version=w.get("version", 1)
+                ))
+                continue
             result.append(WorkoutResponse(
                 id=w["id"],
                 name=w["name"],
@@ -1824,7 +3134,7 @@ async def list_workouts(
     return result
 
 @api_router.get("/workouts/{workout_id}", response_model=WorkoutResponse)
-async def get_workout(workout_id: str, current_user: dict = Depends(get_current_user)):
+async def get_workout(workout_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     query = {"id": workout_id}
     
     if current_user["role"] == "personal":
@@ -1832,9 +3142,19 @@ async def get_workout(workout_id: str, current_user: dict = Depends(get_current_
     else:
         query["student_id"] = current_user["id"]
     
+    if has_cache_validators(request):
+        # Check the validators on a light projection before reading the days
+        current = await db.workouts.find_one(query, WORKOUT_VALIDATOR_PROJECTION)
+        if not current:
+            raise HTTPException(status_code=404, detail="Treino não encontrado")
+        headers = workout_validators([current])
+        if is_not_modified(request, headers):
+            return not_modified_response(headers)
+
     workout = await db.workouts.find_one(query, {"_id": 0})
     if not workout:
         raise HTTPException(status_code=404, detail="Treino não encontrado")
+    response.headers.update(workout_validators([workout]))
     
     return WorkoutResponse(
         id=workout["id"],
@@ -1950,52 +3270,238 @@ async def assign_workout_to_student(
 
     await db.workouts.insert_one(new_workout)
 
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": student_id,
-        "title": "Treino atualizado",
-        "message": f"Seu personal enviou um treino: {new_workout['name']}",
-        "type": "workout",
-        "read": False,
-        "created_at": now
-    })
+    await create_notification(
+        student_id,
+        "Treino atualizado",
+        f"Seu personal enviou um treino: {new_workout['name']}",
+        type="workout",
+        created_at=now
+    )
 
     return {"message": "Treino enviado com sucesso", "workout_id": new_id}
 
 # ==================== PROGRESS TRACKING ====================
 
-@api_router.post("/progress", response_model=ProgressResponse)
-async def log_progress(progress: ProgressLog, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "student":
-        raise HTTPException(status_code=403, detail="Apenas alunos podem registrar progresso")
-    
-    progress_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
-    
-    progress_doc = {
-        "id": progress_id,
-        "student_id": current_user["id"],
+# Daily per-exercise rollups (db.progress_daily), one row per (student_id, exercise_name, day).
+# A rebuild only marks them complete if no log bumped the status version meanwhile.
+
+def estimate_one_rep_max(weight: float, reps: int) -> float:
+    # Epley formula
+    if reps <= 1:
+        return weight
+    return round(weight * (1 + reps / 30), 2)
+
+def set_metric(value, cast) -> float:
+    try:
+        return max(cast(value or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+def progress_rollup_delta(progress_doc: dict) -> dict:
+    inc: Dict[str, Any] = {"log_count": 1}
+    maxes: Dict[str, Any] = {"last_logged_at": progress_doc["logged_at"]}
+    mins: Dict[str, Any] = {}
+
+    difficulty = progress_doc.get("difficulty")
+    if difficulty is None:
+        inc["unrated_count"] = 1
+    else:
+        maxes["max_difficulty"] = difficulty
+
+    sets = progress_doc.get("sets_completed") or []
+    if not sets:
+        inc["empty_logs"] = 1
+        return {"inc": inc, "max": maxes, "min": mins}
+
+    set_count = total_reps = 0
+    volume = 0.0
+    max_weight = est_1rm = 0.0
+    max_reps = 0
+    min_reps = None
+    for s in sets:
+        weight = set_metric(s.get("weight"), float)
+        reps = set_metric(s.get("reps"), int)
+        set_count += 1
+        total_reps += reps
+        volume += weight * reps
+        max_weight = max(max_weight, weight)
+        max_reps = max(max_reps, reps)
+        min_reps = reps if min_reps is None else min(min_reps, reps)
+        est_1rm = max(est_1rm, estimate_one_rep_max(weight, reps))
+
+    inc.update({"set_count": set_count, "total_reps": total_reps, "volume": round(volume, 2)})
+    maxes.update({"max_weight": max_weight, "max_reps": max_reps, "est_1rm": est_1rm})
+    mins["min_reps"] = min_reps
+    return {"inc": inc, "max": maxes, "min": mins}
+
+def progress_rollup_key(progress_doc: dict) -> dict:
+    return {
+        "student_id": progress_doc["student_id"],
+        "exercise_name": progress_doc["exercise_name"],
+        "day": progress_doc["logged_at"][:10],
+    }
+
+def merge_rollup_delta(row: dict, delta: dict) -> dict:
+    for field, value in delta["inc"].items():
+        row[field] = row.get(field, 0) + value
+    for field, value in delta["max"].items():
+        row[field] = value if row.get(field) is None else max(row[field], value)
+    for field, value in delta["min"].items():
+        row[field] = value if row.get(field) is None else min(row[field], value)
+    return row
+
+async def apply_progress_rollups(progress_docs: List[dict]):
+    operations = []
+    for p in progress_docs:
+        delta = progress_rollup_delta(p)
+        update: Dict[str, Any] = {"$inc": delta["inc"], "$max": delta["max"]}
+        if delta["min"]:
+            update["$min"] = delta["min"]
+        operations.append(UpdateOne(progress_rollup_key(p), update, upsert=True))
+    if operations:
+        await db.progress_daily.bulk_write(operations, ordered=False)
+        for student_id in {p["student_id"] for p in progress_docs}:
+            await db.progress_rollup_status.update_one(
+                {"student_id": student_id}, {"$inc": {"version": 1}}, upsert=True
+            )
+
+async def rebuild_progress_rollups(student_id: str):
+    status = await db.progress_rollup_status.find_one_and_update(
+        {"student_id": student_id},
+        {"$set": {"complete": False}},
+        projection={"_id": 0, "version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    version = status.get("version")
+    rows: Dict[tuple, dict] = {}
+    async for p in db.progress.find(
+        {"student_id": student_id},
+        {"_id": 0, "student_id": 1, "exercise_name": 1, "sets_completed": 1, "difficulty": 1, "logged_at": 1}
+    ):
+        key = progress_rollup_key(p)
+        row = rows.setdefault(tuple(key.values()), dict(key))
+        merge_rollup_delta(row, progress_rollup_delta(p))
+    operations = [
+        UpdateOne(
+            {"student_id": row["student_id"], "exercise_name": row["exercise_name"], "day": row["day"]},
+            {"$set": row},
+            upsert=True
+        )
+        for row in rows.values()
+    ]
+    for start in range(0, len(operations), PROGRESS_ROLLUP_BATCH_SIZE):
+        await db.progress_daily.bulk_write(operations[start:start + PROGRESS_ROLLUP_BATCH_SIZE], ordered=False)
+    try:
+        # Left incomplete when a log landed meanwhile, so the next read rebuilds
+        await db.progress_rollup_status.update_one(
+            {"student_id": student_id, "version": version if version is not None else {"$exists": False}},
+            {"$set": {"complete": True, "rebuilt_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+async def ensure_progress_rollups(student_id: str):
+    # Students with history from before the rollups existed
+    status = await db.progress_rollup_status.find_one({"student_id": student_id}, {"_id": 0, "complete": 1})
+    if not status or not status.get("complete"):
+        await rebuild_progress_rollups(student_id)
+
+async def backfill_progress_rollups():
+    done = {s["student_id"] async for s in db.progress_rollup_status.find({"complete": True}, {"_id": 0, "student_id": 1})}
+    async for student in db.users.find({"role": "student"}, {"_id": 0, "id": 1}):
+        if student["id"] in done:
+            continue
+        try:
+            await rebuild_progress_rollups(student["id"])
+        except PyMongoError as e:
+            logger.error("Falha ao reconstruir rollups de %s: %s", student["id"], e)
+
+def build_progress_doc(student_id: str, progress: ProgressLog, logged_at: str) -> dict:
+    doc = {
+        "id": str(uuid.uuid4()),
+        "student_id": student_id,
         "workout_id": progress.workout_id,
         "exercise_name": progress.exercise_name,
         "day_name": progress.day_name,
         "sets_completed": progress.sets_completed,
         "notes": progress.notes,
         "difficulty": progress.difficulty,
-        "logged_at": now
+        "logged_at": logged_at,
+        "synced_at": datetime.now(timezone.utc).isoformat()
     }
+    if progress.client_op_id:
+        doc["client_op_id"] = progress.client_op_id
+    return doc
+
+# Returns (inserted, duplicates); duplicates are logs whose client_op_id was already applied
+async def insert_progress_docs(student: dict, progress_docs: List[dict]) -> tuple:
+    duplicate_indexes = set()
+    try:
+        await db.progress.insert_many(progress_docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        duplicate_indexes = {err["index"] for err in errors}
+
+    inserted = [doc for i, doc in enumerate(progress_docs) if i not in duplicate_indexes]
+    duplicates = []
+    if duplicate_indexes:
+        op_ids = [progress_docs[i].get("client_op_id") for i in sorted(duplicate_indexes)]
+        duplicates = await db.progress.find(
+            {"student_id": student["id"], "client_op_id": {"$in": op_ids}},
+            {"_id": 0}
+        ).to_list(len(op_ids))
+    if inserted:
+        await on_progress_logged(student, inserted)
+    return inserted, duplicates
+
+@api_router.post("/progress", response_model=ProgressResponse)
+async def log_progress(progress: ProgressLog, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "student":
+        raise HTTPException(status_code=403, detail="Apenas alunos podem registrar progresso")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    progress_doc = build_progress_doc(current_user["id"], progress, now)
+    
+    inserted, duplicates = await insert_progress_docs(current_user, [progress_doc])
+    
+    return ProgressResponse(**(inserted or duplicates)[0])
+
+@api_router.post("/progress/batch", response_model=ProgressBatchResponse)
+async def log_progress_batch(batch: ProgressBatchCreate, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "student":
+        raise HTTPException(status_code=403, detail="Apenas alunos podem registrar progresso")
+    
+    workout_ids = {entry.workout_id for entry in batch.entries}
+    day_names = {entry.day_name for entry in batch.entries}
+    if len(workout_ids) > 1 or len(day_names) > 1:
+        raise HTTPException(status_code=400, detail="Todos os registros devem ser do mesmo treino e dia")
+    workout_id = workout_ids.pop()
+    if batch.session and (batch.session.workout_id != workout_id or batch.session.day_name not in day_names):
+        raise HTTPException(status_code=400, detail="A sessão deve ser do mesmo treino e dia dos registros")
+    
+    workout = await db.workouts.find_one(
+        {"id": workout_id, "student_id": current_user["id"], "archived": {"$ne": True}},
+        {"_id": 0, "id": 1}
+    )
+    if not workout:
+        raise HTTPException(status_code=404, detail="Treino não encontrado")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    progress_docs = [build_progress_doc(current_user["id"], entry, now) for entry in batch.entries]
+    
+    inserted, duplicates = await insert_progress_docs(current_user, progress_docs)
     
-    await db.progress.insert_one(progress_doc)
-    
-    return ProgressResponse(
-        id=progress_id,
-        student_id=current_user["id"],
-        workout_id=progress.workout_id,
-        exercise_name=progress.exercise_name,
-        day_name=progress.day_name,
-        sets_completed=progress.sets_completed,
-        notes=progress.notes,
-        difficulty=progress.difficulty,
-        logged_at=now
+    session = None
+    if batch.session:
+        session, _ = await complete_workout_session(current_user, batch.session)
+    
+    return ProgressBatchResponse(
+        progress=[ProgressResponse(**doc) for doc in inserted + duplicates],
+        session=session
     )
 
 @api_router.get("/progress", response_model=List[ProgressResponse])
@@ -2049,19 +3555,26 @@ async def get_evolution(
                 raise HTTPException(status_code=404, detail="Aluno não encontrado")
             query["student_id"] = student_id
     
-    progress_list = await db.progress.find(query, {"_id": 0}).sort("logged_at", 1).to_list(500)
+    if "student_id" in query:
+        await ensure_progress_rollups(query["student_id"])
+    rows = await db.progress_daily.find(
+        query,
+        {"_id": 0, "day": 1, "max_weight": 1, "total_reps": 1, "volume": 1, "est_1rm": 1}
+    ).sort("day", 1).to_list(500)
     
-    evolution_data = []
-    for p in progress_list:
-        if p["sets_completed"]:
-            max_weight = max((s.get("weight", 0) for s in p["sets_completed"]), default=0)
-            total_reps = sum(s.get("reps", 0) for s in p["sets_completed"])
-            evolution_data.append({
-                "date": p["logged_at"][:10],
-                "weight": max_weight,
-                "reps": total_reps,
-                "exercise": exercise_name
-            })
+    evolution_data = [
+        {
+            "date": row["day"],
+            "weight": row["max_weight"],
+            "reps": row["total_reps"],
+            "volume": row["volume"],
+            "est_1rm": row["est_1rm"],
+            "exercise": exercise_name
+        }
+        for row in rows
+        # Days with only empty logs have no set data to plot
+        if row.get("max_weight") is not None
+    ]
     
     return evolution_data
 
@@ -2082,12 +3595,13 @@ async def get_progress_suggestion(
             raise HTTPException(status_code=404, detail="Aluno não encontrado")
         target_student_id = student_id
 
-    progress_list = await db.progress.find(
+    await ensure_progress_rollups(target_student_id)
+    recent_days = await db.progress_daily.find(
         {"student_id": target_student_id, "exercise_name": exercise_name},
         {"_id": 0}
-    ).sort("logged_at", -1).to_list(3)
+    ).sort("day", -1).to_list(3)
 
-    if len(progress_list) < 3:
+    if len(recent_days) < 3:
         return {"eligible": False, "reason": "Poucos registros recentes para sugerir aumento"}
 
     # Determine target reps from workout, if provided
@@ -2104,25 +3618,21 @@ async def get_progress_suggestion(
                             target_reps_min = int(numbers[0])
                         break
 
-    def reps_completed_ok(progress_item):
-        sets = progress_item.get("sets_completed", [])
-        if not sets:
+    def reps_completed_ok(row):
+        # Every log of the day had sets, and every set reached the target
+        if row.get("empty_logs") or not row.get("set_count"):
             return False
         if target_reps_min is None:
             return True
-        return all((s.get("reps", 0) or 0) >= target_reps_min for s in sets)
+        return row.get("min_reps", 0) >= target_reps_min
 
-    for p in progress_list:
-        if p.get("difficulty") is None or p.get("difficulty") > 2:
+    for row in recent_days:
+        if row.get("unrated_count") or row.get("max_difficulty", 0) > 2:
             return {"eligible": False, "reason": "Dificuldade alta nos últimos treinos"}
-        if not reps_completed_ok(p):
+        if not reps_completed_ok(row):
             return {"eligible": False, "reason": "Repetições não concluídas na meta"}
 
-    last = progress_list[0]
-    if not last.get("sets_completed"):
-        return {"eligible": False, "reason": "Sem dados suficientes de carga"}
-
-    current_max = max((s.get("weight", 0) for s in last["sets_completed"]), default=0)
+    current_max = recent_days[0].get("max_weight") or 0
     if current_max <= 0:
         return {"eligible": False, "reason": "Carga atual inválida"}
 
@@ -2139,29 +3649,99 @@ async def get_progress_suggestion(
 
 # ==================== WORKOUT SESSIONS ====================
 
-@api_router.post("/workout-sessions", response_model=WorkoutSessionResponse)
-async def create_workout_session(
-    session: WorkoutSessionCreate,
-    current_user: dict = Depends(get_current_user)
-):
-    if current_user["role"] != "student":
-        raise HTTPException(status_code=403, detail="Apenas alunos podem concluir treinos")
+# Open-session accumulators (db.session_accumulators), one row per (student_id, workout_id, day_name).
+# A row whose update failed is marked stale and completion scans the logs instead.
 
-    workout = await db.workouts.find_one(
-        {"id": session.workout_id, "student_id": current_user["id"], "archived": {"$ne": True}},
-        {"_id": 0}
-    )
-    if not workout:
-        raise HTTPException(status_code=404, detail="Treino não encontrado")
+def session_metrics_from_logs(progress_docs: List[dict]) -> Dict[tuple, dict]:
+    metrics: Dict[tuple, dict] = {}
+    for entry in progress_docs:
+        key = (entry["student_id"], entry["workout_id"], entry.get("day_name"))
+        m = metrics.setdefault(key, {
+            "total_volume_kg": 0.0, "total_reps": 0, "total_sets": 0, "exercises": [],
+            "log_count": 0, "opened_at": entry["logged_at"], "last_logged_at": entry["logged_at"]
+        })
+        m["log_count"] += 1
+        m["opened_at"] = min(m["opened_at"], entry["logged_at"])
+        m["last_logged_at"] = max(m["last_logged_at"], entry["logged_at"])
+        valid_sets_for_exercise = 0
+        for s in entry.get("sets_completed", []) or []:
+            weight = set_metric(s.get("weight"), float)
+            reps = set_metric(s.get("reps"), int)
+            m["total_volume_kg"] += weight * reps
+            m["total_reps"] += reps
+            if weight > 0 or reps > 0:
+                m["total_sets"] += 1
+                valid_sets_for_exercise += 1
+        if valid_sets_for_exercise > 0 and entry.get("exercise_name") and entry["exercise_name"] not in m["exercises"]:
+            m["exercises"].append(entry["exercise_name"])
+    return metrics
+
+async def apply_session_accumulators(progress_docs: List[dict]):
+    operations = [
+        UpdateOne(
+            {"student_id": student_id, "workout_id": workout_id, "day_name": day_name},
+            {
+                "$inc": {
+                    "total_volume_kg": m["total_volume_kg"],
+                    "total_reps": m["total_reps"],
+                    "total_sets": m["total_sets"],
+                    "log_count": m["log_count"],
+                },
+                "$addToSet": {"exercises": {"$each": m["exercises"]}},
+                "$min": {"opened_at": m["opened_at"]},
+                "$max": {"last_logged_at": m["last_logged_at"]},
+            },
+            upsert=True
+        )
+        for (student_id, workout_id, day_name), m in session_metrics_from_logs(progress_docs).items()
+    ]
+    if operations:
+        await db.session_accumulators.bulk_write(operations, ordered=False)
+
+async def mark_session_accumulators_stale(progress_docs: List[dict]):
+    keys = {(p["student_id"], p["workout_id"], p.get("day_name")) for p in progress_docs}
+    await db.session_accumulators.bulk_write([
+        UpdateOne(
+            {"student_id": student_id, "workout_id": workout_id, "day_name": day_name},
+            {"$set": {"stale": True}},
+            upsert=True
+        )
+        for student_id, workout_id, day_name in keys
+    ], ordered=False)
+
+# None when there is nothing to claim or a claimed row is stale
+async def take_session_accumulators(student_id: str, workout_id: str, day_name: Optional[str]) -> Optional[dict]:
+    query: Dict[str, Any] = {"student_id": student_id, "workout_id": workout_id}
+    if day_name:
+        query["day_name"] = day_name
+    claimed = []
+    async for acc in db.session_accumulators.find(query, {"_id": 1}):
+        # Claimed one by one so a log landing meanwhile is either in the
+        # returned row or starts a new one, never lost
+        row = await db.session_accumulators.find_one_and_delete({"_id": acc["_id"]})
+        if row:
+            claimed.append(row)
+    if not claimed or any(row.get("stale") for row in claimed):
+        return None
+    exercises = set()
+    for row in claimed:
+        exercises.update(row.get("exercises", []))
+    return {
+        "total_volume_kg": sum(row.get("total_volume_kg", 0) for row in claimed),
+        "total_reps": sum(row.get("total_reps", 0) for row in claimed),
+        "total_sets": sum(row.get("total_sets", 0) for row in claimed),
+        "exercises": sorted(exercises),
+    }
 
-    # Build metrics from progress logged since the previous completed session
-    # for this workout/day.
+# Fallback for replayed offline sessions and missing or stale accumulators
+async def scan_session_metrics(student_id: str, workout_id: str, day_name: Optional[str], completed_at: str) -> dict:
     last_session_query: Dict[str, Any] = {
-        "student_id": current_user["id"],
-        "workout_id": session.workout_id
+        "student_id": student_id,
+        "workout_id": workout_id
     }
-    if session.day_name:
-        last_session_query["day_name"] = session.day_name
+    if day_name:
+        last_session_query["day_name"] = day_name
+    last_session_query["completed_at"] = {"$lt": completed_at}
 
     previous_sessions = await db.workout_sessions.find(
         last_session_query,
@@ -2171,55 +3751,64 @@ async def create_workout_session(
     previous_completed_at = previous_sessions[0]["completed_at"] if previous_sessions else None
 
     progress_query: Dict[str, Any] = {
-        "student_id": current_user["id"],
-        "workout_id": session.workout_id
+        "student_id": student_id,
+        "workout_id": workout_id
     }
-    if session.day_name:
-        progress_query["day_name"] = session.day_name
+    if day_name:
+        progress_query["day_name"] = day_name
+    progress_query["logged_at"] = {"$lte": completed_at}
     if previous_completed_at:
-        progress_query["logged_at"] = {"$gt": previous_completed_at}
+        progress_query["logged_at"]["$gt"] = previous_completed_at
 
     progress_entries = await db.progress.find(
         progress_query,
-        {"_id": 0, "exercise_name": 1, "sets_completed": 1}
+        {"_id": 0, "student_id": 1, "workout_id": 1, "exercise_name": 1, "sets_completed": 1, "logged_at": 1}
     ).to_list(2000)
 
-    total_volume_kg = 0.0
-    total_reps = 0
-    total_sets = 0
-    exercises_completed = set()
-
-    for entry in progress_entries:
-        sets = entry.get("sets_completed", []) or []
-        valid_sets_for_exercise = 0
-
-        for s in sets:
-            weight = float(s.get("weight", 0) or 0)
-            reps = int(s.get("reps", 0) or 0)
-
-            if weight < 0:
-                weight = 0
-            if reps < 0:
-                reps = 0
-
-            total_volume_kg += weight * reps
-            total_reps += reps
-
-            if weight > 0 or reps > 0:
-                total_sets += 1
-                valid_sets_for_exercise += 1
-
-        if valid_sets_for_exercise > 0 and entry.get("exercise_name"):
-            exercises_completed.add(entry["exercise_name"])
+    totals = {"total_volume_kg": 0.0, "total_reps": 0, "total_sets": 0, "exercises": set()}
+    # The helper groups by day_name; a session without day_name sums them all
+    for m in session_metrics_from_logs(progress_entries).values():
+        totals["total_volume_kg"] += m["total_volume_kg"]
+        totals["total_reps"] += m["total_reps"]
+        totals["total_sets"] += m["total_sets"]
+        totals["exercises"].update(m["exercises"])
+    totals["exercises"] = sorted(totals["exercises"])
+    return totals
+
+# Returns (session, created); created is False for an already applied client_op_id
+async def complete_workout_session(
+    student: dict,
+    session: WorkoutSessionCreate,
+    completed_at: Optional[str] = None
+) -> Tuple[WorkoutSessionResponse, bool]:
+    now = datetime.now(timezone.utc).isoformat()
+    replayed = completed_at is not None
+    completed_at = completed_at or now
+
+    op_filter = {"student_id": student["id"], "client_op_id": session.client_op_id}
+    if session.client_op_id:
+        # Checked up front so a retry does not claim the next session's logs
+        existing = await db.workout_sessions.find_one(op_filter, {"_id": 0})
+        if existing:
+            return WorkoutSessionResponse(**existing), False
+
+    if replayed:
+        # Offline replay: the open accumulator may already hold logs made
+        # after this session, so count its window from the raw logs
+        metrics = await scan_session_metrics(student["id"], session.workout_id, session.day_name, completed_at)
+        await take_session_accumulators(student["id"], session.workout_id, session.day_name)
+    else:
+        metrics = await take_session_accumulators(student["id"], session.workout_id, session.day_name)
+        if metrics is None:
+            metrics = await scan_session_metrics(student["id"], session.workout_id, session.day_name, completed_at)
 
-    total_volume_kg = round(total_volume_kg, 2)
+    total_volume_kg = round(metrics["total_volume_kg"], 2)
     estimated_calories = int(round(total_volume_kg * 0.045))
 
     session_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
     session_doc = {
         "id": session_id,
-        "student_id": current_user["id"],
+        "student_id": student["id"],
         "workout_id": session.workout_id,
         "day_name": session.day_name,
         "notes": session.notes,
@@ -2228,15 +3817,42 @@ async def create_workout_session(
         "recovery_score": session.recovery_score,
         "effort_score": session.effort_score,
         "total_volume_kg": total_volume_kg,
-        "total_reps": total_reps,
-        "total_sets": total_sets,
-        "exercises_completed": len(exercises_completed),
+        "total_reps": metrics["total_reps"],
+        "total_sets": metrics["total_sets"],
+        "exercises_completed": len(metrics["exercises"]),
         "estimated_calories": estimated_calories,
-        "completed_at": now
+        "completed_at": completed_at,
+        "synced_at": now
     }
+    if session.client_op_id:
+        session_doc["client_op_id"] = session.client_op_id
 
-    await db.workout_sessions.insert_one(session_doc)
-    return WorkoutSessionResponse(**session_doc)
+    try:
+        await db.workout_sessions.insert_one(session_doc)
+    except DuplicateKeyError:
+        # A concurrent retry recorded it first
+        existing = await db.workout_sessions.find_one(op_filter, {"_id": 0})
+        return WorkoutSessionResponse(**existing), False
+    await on_activity(student, [completed_at])
+    return WorkoutSessionResponse(**session_doc), True
+
+@api_router.post("/workout-sessions", response_model=WorkoutSessionResponse)
+async def create_workout_session(
+    session: WorkoutSessionCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "student":
+        raise HTTPException(status_code=403, detail="Apenas alunos podem concluir treinos")
+
+    workout = await db.workouts.find_one(
+        {"id": session.workout_id, "student_id": current_user["id"], "archived": {"$ne": True}},
+        {"_id": 0}
+    )
+    if not workout:
+        raise HTTPException(status_code=404, detail="Treino não encontrado")
+
+    recorded, _ = await complete_workout_session(current_user, session)
+    return recorded
 
 @api_router.get("/workout-sessions", response_model=List[WorkoutSessionResponse])
 async def list_workout_sessions(
@@ -2274,6 +3890,124 @@ async def list_workout_sessions(
     sessions = await db.workout_sessions.find(query, {"_id": 0}).sort("completed_at", -1).to_list(500)
     return [WorkoutSessionResponse(**s) for s in sessions]
 
+# ==================== OFFLINE SYNC ====================
+
+# Collections a client pulls on sync, with the response model of each
+SYNC_PULL_COLLECTIONS = {
+    "progress": ProgressResponse,
+    "workout_sessions": WorkoutSessionResponse,
+}
+
+def encode_sync_cursor(positions: Dict[str, str]) -> str:
+    # Opaque to the client: "<synced_at>|<id>" of the last document pulled
+    # from each collection
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(",", ":")).encode()).decode()
+
+def decode_sync_cursor(cursor: Optional[str]) -> Dict[str, str]:
+    if not cursor:
+        return {}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(positions, dict):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {name: positions[name] for name in SYNC_PULL_COLLECTIONS if isinstance(positions.get(name), str)}
+
+def sync_timestamp(performed_at: Optional[str], now: datetime) -> str:
+    if not performed_at:
+        return now.isoformat()
+    moment = datetime.fromisoformat(performed_at.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return min(moment.astimezone(timezone.utc), now).isoformat()
+
+async def pull_sync_changes(student_id: str, positions: Dict[str, str]) -> tuple:
+    # Writes from the last few seconds are held back so a slower concurrent
+    # write with an earlier synced_at cannot fall behind the cursor
+    settled = (datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+    changes = {}
+    has_more = False
+    for name, model in SYNC_PULL_COLLECTIONS.items():
+        query: Dict[str, Any] = {"student_id": student_id, "synced_at": {"$lte": settled}}
+        if name in positions:
+            synced_at, _, doc_id = positions[name].rpartition("|")
+            query["$or"] = [
+                {"synced_at": {"$gt": synced_at}},
+                {"synced_at": synced_at, "id": {"$gt": doc_id}}
+            ]
+        docs = await db[name].find(query, {"_id": 0}).sort(
+            [("synced_at", 1), ("id", 1)]
+        ).limit(SYNC_PULL_LIMIT).to_list(SYNC_PULL_LIMIT)
+        if docs:
+            positions[name] = f"{docs[-1]['synced_at']}|{docs[-1]['id']}"
+        has_more = has_more or len(docs) == SYNC_PULL_LIMIT
+        changes[name] = [model(**doc) for doc in docs]
+    return changes, has_more
+
+@api_router.post("/sync")
+async def sync_operations(payload: SyncRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "student":
+        raise HTTPException(status_code=403, detail="Apenas alunos podem sincronizar")
+
+    positions = decode_sync_cursor(payload.cursor)
+    now = datetime.now(timezone.utc)
+    applied: List[str] = []
+    duplicates: List[str] = []
+    rejected: List[dict] = []
+
+    progress_docs = []
+    sessions = []
+    seen = set()
+    for op in payload.operations:
+        if op.op_id in seen:
+            duplicates.append(op.op_id)
+            continue
+        seen.add(op.op_id)
+        try:
+            performed_at = sync_timestamp(op.performed_at, now)
+        except ValueError:
+            rejected.append({"op_id": op.op_id, "detail": "performed_at inválido"})
+            continue
+        if op.type == "progress" and op.progress:
+            entry = op.progress.model_copy(update={"client_op_id": op.op_id})
+            progress_docs.append(build_progress_doc(current_user["id"], entry, performed_at))
+        elif op.type == "session" and op.session:
+            sessions.append((performed_at, op.op_id, op.session.model_copy(update={"client_op_id": op.op_id})))
+        else:
+            rejected.append({"op_id": op.op_id, "detail": f"Dados ausentes para operação {op.type}"})
+
+    if progress_docs:
+        inserted, existing = await insert_progress_docs(current_user, progress_docs)
+        applied += [doc["client_op_id"] for doc in inserted]
+        duplicates += [doc["client_op_id"] for doc in existing]
+
+    # Sessions after the logs they summarize, in the order they happened
+    workout_ids = list({session.workout_id for _, _, session in sessions})
+    active_workouts = {
+        w["id"] async for w in db.workouts.find(
+            {"id": {"$in": workout_ids}, "student_id": current_user["id"], "archived": {"$ne": True}},
+            {"_id": 0, "id": 1}
+        )
+    } if workout_ids else set()
+    for performed_at, op_id, session in sorted(sessions, key=lambda item: item[0]):
+        if session.workout_id not in active_workouts:
+            rejected.append({"op_id": op_id, "detail": "Treino não encontrado"})
+            continue
+        _, created = await complete_workout_session(current_user, session, completed_at=performed_at)
+        (applied if created else duplicates).append(op_id)
+
+    changes, has_more = await pull_sync_changes(current_user["id"], positions)
+    return {
+        "applied": applied,
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "progress": changes["progress"],
+        "workout_sessions": changes["workout_sessions"],
+        "cursor": encode_sync_cursor(positions),
+        "has_more": has_more,
+    }
+
 # ==================== NOTIFICATIONS ====================
 
 @api_router.get("/notifications", response_model=List[NotificationResponse])
@@ -2311,6 +4045,197 @@ async def mark_all_notifications_read(current_user: dict = Depends(get_current_u
     )
     return {"message": "Todas notificações marcadas como lidas"}
 
+# ==================== ACTIVITY CALENDAR ====================
+
+# One document per student (db.activity) with a bit per active UTC day since ACTIVITY_EPOCH,
+# packed into 32-bit words under words.<word index>
+ACTIVITY_EPOCH = date(2020, 1, 1)
+ACTIVITY_WORD_BITS = 32
+ACTIVITY_FULL_WORD = (1 << ACTIVITY_WORD_BITS) - 1
+STREAK_MILESTONES = (3, 7, 30)
+
+def activity_day_index(day: str) -> Optional[int]:
+    index = (date.fromisoformat(day[:10]) - ACTIVITY_EPOCH).days
+    return index if index >= 0 else None
+
+def activity_day(index: int) -> str:
+    return (ACTIVITY_EPOCH + timedelta(days=index)).isoformat()
+
+def activity_bits_update(days: List[str]) -> dict:
+    words: Dict[str, int] = {}
+    for day in days:
+        index = activity_day_index(day)
+        if index is None:
+            continue
+        key = str(index // ACTIVITY_WORD_BITS)
+        words[key] = words.get(key, 0) | (1 << (index % ACTIVITY_WORD_BITS))
+    return {f"words.{key}": {"or": bits} for key, bits in words.items()}
+
+def is_active_day(activity: dict, index: int) -> bool:
+    word = activity.get("words", {}).get(str(index // ACTIVITY_WORD_BITS), 0)
+    return bool(word >> (index % ACTIVITY_WORD_BITS) & 1)
+
+def streak_ending_at(activity: dict, index: int) -> int:
+    words = activity.get("words", {})
+    streak = 0
+    while index >= 0:
+        offset = index % ACTIVITY_WORD_BITS
+        word = words.get(str(index // ACTIVITY_WORD_BITS), 0)
+        if offset == ACTIVITY_WORD_BITS - 1 and word == ACTIVITY_FULL_WORD:
+            # Whole word active: skip it at once
+            streak += ACTIVITY_WORD_BITS
+            index -= ACTIVITY_WORD_BITS
+            continue
+        if not word >> offset & 1:
+            break
+        streak += 1
+        index -= 1
+    return streak
+
+def summarize_activity(activity: dict) -> dict:
+    today = activity_day_index(datetime.now(timezone.utc).date().isoformat())
+    max_streak = 0
+    milestones: Dict[int, str] = {}
+    last_active = None
+    run = 0
+    previous = None
+    for key in sorted(activity.get("words", {}), key=int):
+        word = activity["words"][key]
+        base = int(key) * ACTIVITY_WORD_BITS
+        while word:
+            offset = (word & -word).bit_length() - 1
+            word &= word - 1
+            index = base + offset
+            run = run + 1 if previous == index - 1 else 1
+            previous = index
+            max_streak = max(max_streak, run)
+            for days in STREAK_MILESTONES:
+                if run == days and days not in milestones:
+                    milestones[days] = activity_day(index)
+    if previous is not None:
+        last_active = activity_day(previous)
+    return {
+        # Ending today (ranking) and ending today or yesterday (dashboard)
+        "current_streak": streak_ending_at(activity, today),
+        "recent_streak": streak_ending_at(activity, today) or streak_ending_at(activity, today - 1),
+        "max_streak": max_streak,
+        "last_active": last_active,
+        "milestones": milestones,
+    }
+
+async def activity_days_from_history(student_id: str) -> List[str]:
+    days = set()
+    sources = (
+        (db.progress, "logged_at"),
+        (db.workout_sessions, "completed_at"),
+        (db.checkins, "check_in_time"),
+    )
+    for collection, field in sources:
+        async for doc in collection.find({"student_id": student_id}, {"_id": 0, field: 1}):
+            if doc.get(field):
+                days.add(doc[field][:10])
+    return sorted(days)
+
+async def write_activity(student_id: str, days: List[str], complete: bool = False) -> dict:
+    update: Dict[str, Any] = {"$setOnInsert": {"student_id": student_id}}
+    bits = activity_bits_update(days)
+    if bits:
+        update["$bit"] = bits
+    if complete:
+        update["$set"] = {"complete": True}
+    for _ in range(2):
+        try:
+            return await db.activity.find_one_and_update(
+                {"student_id": student_id},
+                update,
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Concurrent upsert of the same student: the retry updates it
+            continue
+    raise RuntimeError(f"Calendário de atividade em conflito: {student_id}")
+
+async def rebuild_activity(student_id: str) -> dict:
+    # OR-ing the history in keeps any bit set concurrently
+    return await write_activity(student_id, await activity_days_from_history(student_id), complete=True)
+
+async def get_activity(student_id: str) -> dict:
+    activity = await db.activity.find_one({"student_id": student_id}, {"_id": 0})
+    if activity is None or not activity.get("complete"):
+        # Students with history from before the calendar existed
+        activity = await rebuild_activity(student_id)
+    return activity
+
+async def mark_activity(student_id: str, days: List[str]) -> dict:
+    activity = await write_activity(student_id, days)
+    if not activity.get("complete"):
+        activity = await rebuild_activity(student_id)
+    return activity
+
+async def on_activity(student: dict, days: List[str], progress_docs: Optional[List[dict]] = None):
+    try:
+        activity = await mark_activity(student["id"], days)
+        summary = summarize_activity(activity)
+        state = await update_gamification_state(student["id"], progress_docs or [], summary)
+        await sync_leaderboard_entry(student, state, summary)
+    except Exception as e:
+        # Drop the state so the next read rebuilds it from history
+        logger.error("Falha ao atualizar atividade de %s: %s", student["id"], e)
+        await db.gamification.delete_one({"student_id": student["id"]})
+
+async def on_progress_logged(student: dict, progress_docs: List[dict]):
+    try:
+        await apply_progress_rollups(progress_docs)
+    except PyMongoError as e:
+        # Rebuilt from the raw logs on the next read
+        logger.error("Falha ao atualizar rollups de %s: %s", student["id"], e)
+        await db.progress_rollup_status.delete_one({"student_id": student["id"]})
+    try:
+        await apply_session_accumulators(progress_docs)
+    except PyMongoError as e:
+        # A stale accumulator makes the session fall back to scanning the logs
+        logger.error("Falha ao atualizar acumulador de sessão de %s: %s", student["id"], e)
+        try:
+            await mark_session_accumulators_stale(progress_docs)
+        except PyMongoError as e:
+            logger.error("Falha ao marcar acumulador de sessão de %s: %s", student["id"], e)
+    await on_activity(student, [p["logged_at"] for p in progress_docs], progress_docs)
+
+@api_router.get("/stats/activity")
+async def get_activity_heatmap(
+    days: int = Query(30, ge=1, le=366),
+    student_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] == "student":
+        student_id = current_user["id"]
+    elif current_user["role"] == "personal":
+        if not student_id:
+            raise HTTPException(status_code=400, detail="student_id é obrigatório para personal")
+        student = await db.users.find_one({"id": student_id, "personal_id": current_user["id"], "role": "student"}, {"_id": 0, "id": 1})
+        if not student:
+            raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    else:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    activity = await get_activity(student_id)
+    summary = summarize_activity(activity)
+    today = activity_day_index(datetime.now(timezone.utc).date().isoformat())
+    heatmap = [
+        {"date": activity_day(index), "active": is_active_day(activity, index)}
+        for index in range(today - days + 1, today + 1)
+        if index >= 0
+    ]
+    return {
+        "days": heatmap,
+        "active_days": sum(1 for d in heatmap if d["active"]),
+        "current_streak": summary["current_streak"],
+        "max_streak": summary["max_streak"],
+        "last_active": summary["last_active"],
+    }
+
 # ==================== STATS ====================
 
 @api_router.get("/stats/personal")
@@ -2326,9 +4251,9 @@ async def get_personal_stats(personal: dict = Depends(get_personal_user)):
     })
     
     # Financial stats
-    payments = await db.payments.find({"personal_id": personal["id"]}, {"_id": 0}).to_list(1000)
-    total_received = sum(p["amount"] for p in payments if p["status"] == "paid")
-    total_pending = sum(p["amount"] for p in payments if p["status"] in ["pending", "overdue"])
+    financial = build_payment_summary(await aggregate_payment_totals({"personal_id": personal["id"]}))
+    total_received = financial["total_received"]
+    total_pending = financial["total_pending"] + financial["total_overdue"]
     
     return {
         "students_count": students_count,
@@ -2352,18 +4277,8 @@ async def get_student_stats(current_user: dict = Depends(get_current_user)):
     total_exercises = sum(len(e) for w in workouts for d in w.get("days", []) for e in [d.get("exercises", [])])
     progress_count = await db.progress.count_documents({"student_id": current_user["id"]})
     
-    streak = 0
-    today = datetime.now(timezone.utc).date()
-    for i in range(30):
-        check_date = (today - timedelta(days=i)).isoformat()
-        has_progress = await db.progress.find_one({
-            "student_id": current_user["id"],
-            "logged_at": {"$gte": check_date, "$lt": (today - timedelta(days=i-1)).isoformat() if i > 0 else check_date + "T23:59:59"}
-        })
-        if has_progress:
-            streak += 1
-        elif i > 0:
-            break
+    activity = await get_activity(current_user["id"])
+    streak = summarize_activity(activity)["recent_streak"]
     
     return {
         "total_exercises": total_exercises,
@@ -2387,6 +4302,91 @@ class MessageResponse(BaseModel):
     read: bool
     created_at: str
 
+def conversation_key(user_a: str, user_b: str) -> str:
+    return ":".join(sorted([user_a, user_b]))
+
+async def rebuild_conversation_summaries(user_id: str, other_ids: List[str]) -> Dict[str, dict]:
+    if not other_ids:
+        return {}
+    pipeline = [
+        {"$match": {"$or": [
+            {"sender_id": user_id, "receiver_id": {"$in": other_ids}},
+            {"sender_id": {"$in": other_ids}, "receiver_id": user_id}
+        ]}},
+        {"$sort": {"created_at": -1}},
+        {"$group": {
+            "_id": {"$cond": [{"$eq": ["$sender_id", user_id]}, "$receiver_id", "$sender_id"]},
+            "last_message": {"$first": "$content"},
+            "last_message_time": {"$first": "$created_at"},
+            "last_sender_id": {"$first": "$sender_id"},
+            "unread_for_user": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$receiver_id", user_id]}, {"$eq": ["$read", False]}]}, 1, 0
+            ]}},
+            "unread_for_other": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$sender_id", user_id]}, {"$eq": ["$read", False]}]}, 1, 0
+            ]}}
+        }}
+    ]
+
+    summaries = {}
+    operations = []
+    async for row in db.messages.aggregate(pipeline):
+        other_id = row["_id"]
+        summary = {
+            "id": conversation_key(user_id, other_id),
+            "participants": sorted([user_id, other_id]),
+            "last_message": row["last_message"],
+            "last_message_time": row["last_message_time"],
+            "last_sender_id": row["last_sender_id"],
+            "unread": {user_id: row["unread_for_user"], other_id: row["unread_for_other"]},
+            "synced": True
+        }
+        summaries[summary["id"]] = summary
+        operations.append(UpdateOne({"id": summary["id"]}, {"$set": summary}, upsert=True))
+
+    # Pairs without any message get an empty summary so they are not rebuilt again.
+    for other_id in other_ids:
+        key = conversation_key(user_id, other_id)
+        if key not in summaries:
+            summaries[key] = {
+                "id": key,
+                "participants": sorted([user_id, other_id]),
+                "last_message": None,
+                "last_message_time": None,
+                "last_sender_id": None,
+                "unread": {},
+                "synced": True
+            }
+            operations.append(UpdateOne({"id": key}, {"$setOnInsert": summaries[key]}, upsert=True))
+
+    if operations:
+        await db.conversations.bulk_write(operations, ordered=False)
+    return summaries
+
+async def get_conversation_summaries(user_id: str, other_ids: List[str]) -> Dict[str, dict]:
+    keys = [conversation_key(user_id, other_id) for other_id in other_ids]
+    summaries = {
+        c["id"]: c
+        for c in await db.conversations.find({"id": {"$in": keys}}, {"_id": 0}).to_list(len(keys) or 1)
+        if c.get("synced")
+    }
+    # Conversations that predate the summaries (or were first written by
+    # send_message before any read) are rebuilt once from the messages.
+    missing = [other_id for other_id in other_ids if conversation_key(user_id, other_id) not in summaries]
+    if missing:
+        summaries.update(await rebuild_conversation_summaries(user_id, missing))
+    return summaries
+
+def build_conversation_entry(user_id: str, other: dict, summary: Optional[dict]) -> dict:
+    summary = summary or {}
+    return {
+        "user_id": other["id"],
+        "user_name": other["name"],
+        "last_message": summary.get("last_message"),
+        "last_message_time": summary.get("last_message_time"),
+        "unread_count": (summary.get("unread") or {}).get(user_id, 0)
+    }
+
 @api_router.post("/chat/messages", response_model=MessageResponse)
 async def send_message(message: MessageCreate, current_user: dict = Depends(get_current_user)):
     receiver = await db.users.find_one({"id": message.receiver_id}, {"_id": 0, "password": 0})
@@ -2415,97 +4415,110 @@ async def send_message(message: MessageCreate, current_user: dict = Depends(get_
     
     await db.messages.insert_one(message_doc)
     
-    await db.notifications.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": message.receiver_id,
-        "title": "Nova mensagem",
-        "message": f"{current_user['name']}: {message.content[:50]}{'...' if len(message.content) > 50 else ''}",
-        "type": "info",
-        "read": False,
-        "created_at": now
-    })
+    await db.conversations.update_one(
+        {"id": conversation_key(current_user["id"], message.receiver_id)},
+        {
+            "$set": {
+                "participants": sorted([current_user["id"], message.receiver_id]),
+                "last_message": message.content,
+                "last_message_time": now,
+                "last_sender_id": current_user["id"]
+            },
+            "$inc": {f"unread.{message.receiver_id}": 1}
+        },
+        upsert=True
+    )
+    
+    await create_notification(
+        message.receiver_id,
+        "Nova mensagem",
+        f"{current_user['name']}: {message.content[:50]}{'...' if len(message.content) > 50 else ''}",
+        type="info",
+        created_at=now
+    )
+    
+    message_doc.pop("_id", None)
+    await event_hub.publish(message.receiver_id, "message", message_doc)
+    await event_hub.publish(current_user["id"], "message", message_doc)
     
     return MessageResponse(**message_doc)
 
+def parse_message_cursor(cursor: str) -> tuple:
+    # Cursors are "<created_at>|<id>" of a message; the id breaks ties between
+    # messages created in the same instant.
+    created_at, sep, message_id = cursor.rpartition("|")
+    if not sep or not created_at or not message_id:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return created_at, message_id
+
+def message_cursor_filter(cursor: str, direction: str) -> dict:
+    created_at, message_id = parse_message_cursor(cursor)
+    return {"$or": [
+        {"created_at": {direction: created_at}},
+        {"created_at": created_at, "id": {direction: message_id}}
+    ]}
+
 @api_router.get("/chat/messages/{user_id}", response_model=List[MessageResponse])
-async def get_messages(user_id: str, current_user: dict = Depends(get_current_user)):
-    messages = await db.messages.find({
-        "$or": [
-            {"sender_id": current_user["id"], "receiver_id": user_id},
-            {"sender_id": user_id, "receiver_id": current_user["id"]}
-        ]
-    }, {"_id": 0}).sort("created_at", 1).to_list(500)
-    
-    await db.messages.update_many(
+async def get_messages(
+    user_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    conversation_filter = {"$or": [
+        {"sender_id": current_user["id"], "receiver_id": user_id},
+        {"sender_id": user_id, "receiver_id": current_user["id"]}
+    ]}
+    
+    if after:
+        # Incremental sync: only what arrived after the client's last message.
+        query = {"$and": [conversation_filter, message_cursor_filter(after, "$gt")]}
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", 1), ("id", 1)]
+        ).limit(limit).to_list(limit)
+    else:
+        query = conversation_filter
+        if before:
+            query = {"$and": [conversation_filter, message_cursor_filter(before, "$lt")]}
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", -1), ("id", -1)]
+        ).limit(limit).to_list(limit)
+        messages.reverse()
+    
+    result = await db.messages.update_many(
         {"sender_id": user_id, "receiver_id": current_user["id"], "read": False},
         {"$set": {"read": True}}
     )
+    if result.modified_count:
+        await db.conversations.update_one(
+            {"id": conversation_key(current_user["id"], user_id)},
+            {"$set": {f"unread.{current_user['id']}": 0}}
+        )
     
     return [MessageResponse(**m) for m in messages]
 
 @api_router.get("/chat/conversations")
 async def get_conversations(current_user: dict = Depends(get_current_user)):
     if current_user["role"] == "personal":
-        students = await db.users.find(
+        contacts = await db.users.find(
             {"personal_id": current_user["id"], "role": "student"},
-            {"_id": 0, "password": 0}
+            {"_id": 0, "id": 1, "name": 1}
         ).to_list(100)
-        
-        conversations = []
-        for student in students:
-            last_msg = await db.messages.find_one(
-                {"$or": [
-                    {"sender_id": current_user["id"], "receiver_id": student["id"]},
-                    {"sender_id": student["id"], "receiver_id": current_user["id"]}
-                ]},
-                sort=[("created_at", -1)]
-            )
-            
-            unread = await db.messages.count_documents({
-                "sender_id": student["id"],
-                "receiver_id": current_user["id"],
-                "read": False
-            })
-            
-            conversations.append({
-                "user_id": student["id"],
-                "user_name": student["name"],
-                "last_message": last_msg["content"] if last_msg else None,
-                "last_message_time": last_msg["created_at"] if last_msg else None,
-                "unread_count": unread
-            })
-        
-        return conversations
     else:
         personal = await db.users.find_one(
             {"id": current_user.get("personal_id")},
-            {"_id": 0, "password": 0}
+            {"_id": 0, "id": 1, "name": 1}
         )
-        
-        if not personal:
-            return []
-        
-        last_msg = await db.messages.find_one(
-            {"$or": [
-                {"sender_id": current_user["id"], "receiver_id": personal["id"]},
-                {"sender_id": personal["id"], "receiver_id": current_user["id"]}
-            ]},
-            sort=[("created_at", -1)]
-        )
-        
-        unread = await db.messages.count_documents({
-            "sender_id": personal["id"],
-            "receiver_id": current_user["id"],
-            "read": False
-        })
-        
-        return [{
-            "user_id": personal["id"],
-            "user_name": personal["name"],
-            "last_message": last_msg["content"] if last_msg else None,
-            "last_message_time": last_msg["created_at"] if last_msg else None,
-            "unread_count": unread
-        }]
+        contacts = [personal] if personal else []
+    
+    summaries = await get_conversation_summaries(current_user["id"], [c["id"] for c in contacts])
+    conversations = [
+        build_conversation_entry(current_user["id"], c, summaries.get(conversation_key(current_user["id"], c["id"])))
+        for c in contacts
+    ]
+    conversations.sort(key=lambda c: c["last_message_time"] or "", reverse=True)
+    return conversations
 
 # ==================== EXERCISE VIDEOS ====================
 
@@ -2514,18 +4527,15 @@ async def get_exercise_video_endpoint(exercise_name: str):
     return {"video_url": resolve_exercise_video_url(exercise_name)}
 
 @api_router.get("/exercises/search")
-async def search_exercises(q: str, current_user: dict = Depends(get_current_user)):
-    results = []
-    q_lower = q.lower()
-    
-    for name, image_url in EXERCISE_IMAGES.items():
-        if q_lower in name:
-            results.append({
-                "name": name.title(),
-                "image_url": image_url
-            })
-    
-    return results[:10]
+async def search_exercises(
+    q: str,
+    category: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    personal_id = current_user["id"] if current_user["role"] == "personal" else current_user.get("personal_id")
+    catalog = await exercise_catalogs.get(personal_id)
+    return catalog.search_index.search(q, category=category, limit=limit)
 
 # ==================== PDF EXPORT ====================
 
@@ -2543,30 +4553,27 @@ async def get_student_report(student_id: str, personal: dict = Depends(get_perso
         {"_id": 0}
     ).to_list(10)
     
-    progress = await db.progress.find(
-        {"student_id": student_id},
-        {"_id": 0}
-    ).sort("logged_at", -1).to_list(100)
+    await ensure_progress_rollups(student_id)
+    rows = await db.progress_daily.find(
+        {"student_id": student_id, "max_weight": {"$exists": True}},
+        {"_id": 0, "exercise_name": 1, "day": 1, "max_weight": 1}
+    ).sort("day", -1).to_list(100)
     
     assessments = await db.assessments.find(
         {"student_id": student_id},
         {"_id": 0}
     ).sort("date", -1).to_list(10)
     
-    total_workouts = len(progress)
-    exercises_done = len(set(p["exercise_name"] for p in progress))
+    state = await get_gamification_state(student_id)
+    total_workouts = state["total_logs"]
+    exercises_done = state["exercise_count"]
     
     evolution = {}
-    for p in progress:
-        ex_name = p["exercise_name"]
-        if ex_name not in evolution:
-            evolution[ex_name] = []
-        if p["sets_completed"]:
-            max_weight = max((s.get("weight", 0) for s in p["sets_completed"]), default=0)
-            evolution[ex_name].append({
-                "date": p["logged_at"][:10],
-                "weight": max_weight
-            })
+    for row in rows:
+        evolution.setdefault(row["exercise_name"], []).append({
+            "date": row["day"],
+            "weight": row["max_weight"]
+        })
     
     return {
         "student": student,
@@ -2592,98 +4599,273 @@ BADGES = {
     "workouts_100": {"id": "workouts_100", "name": "Lenda", "description": "100 treinos registrados", "icon": "crown", "color": "platinum"}
 }
 
-async def calculate_badges(student_id: str) -> list:
-    earned_badges = []
-    
-    progress_list = await db.progress.find(
-        {"student_id": student_id},
-        {"_id": 0}
-    ).sort("logged_at", 1).to_list(1000)
-    
-    if not progress_list:
-        return earned_badges
-    
-    earned_badges.append(BADGES["first_workout"])
-    
-    total_workouts = len(progress_list)
-    if total_workouts >= 50:
-        earned_badges.append(BADGES["workouts_50"])
-    if total_workouts >= 100:
-        earned_badges.append(BADGES["workouts_100"])
-    
-    unique_exercises = len(set(p["exercise_name"] for p in progress_list))
-    if unique_exercises >= 10:
-        earned_badges.append(BADGES["exercises_10"])
-    
-    dates = sorted(set(p["logged_at"][:10] for p in progress_list))
-    max_streak = 1
-    current_streak = 1
-    for i in range(1, len(dates)):
-        prev_date = datetime.fromisoformat(dates[i-1])
-        curr_date = datetime.fromisoformat(dates[i])
-        if (curr_date - prev_date).days == 1:
-            current_streak += 1
-            max_streak = max(max_streak, current_streak)
-        else:
-            current_streak = 1
-    
-    if max_streak >= 3:
-        earned_badges.append(BADGES["streak_3"])
-    if max_streak >= 7:
-        earned_badges.append(BADGES["streak_7"])
-    if max_streak >= 30:
-        earned_badges.append(BADGES["streak_30"])
-    
-    exercise_progress = {}
-    for p in progress_list:
-        ex_name = p["exercise_name"]
-        if p["sets_completed"]:
-            max_weight = max((s.get("weight", 0) for s in p["sets_completed"]), default=0)
-            if ex_name not in exercise_progress:
-                exercise_progress[ex_name] = {"first": max_weight, "last": max_weight}
-            else:
-                exercise_progress[ex_name]["last"] = max_weight
-    
-    max_improvement = 0
-    for ex_name, data in exercise_progress.items():
-        improvement = data["last"] - data["first"]
-        max_improvement = max(max_improvement, improvement)
-    
-    if max_improvement >= 10:
-        earned_badges.append(BADGES["weight_up_10"])
-    if max_improvement >= 25:
-        earned_badges.append(BADGES["weight_up_25"])
-    
-    return earned_badges
+# Order in which earned badges are listed
+BADGE_ORDER = [
+    "first_workout", "workouts_50", "workouts_100", "exercises_10",
+    "streak_3", "streak_7", "streak_30", "weight_up_10", "weight_up_25"
+]
 
-async def calculate_records(student_id: str) -> dict:
-    progress_list = await db.progress.find(
-        {"student_id": student_id},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    records = {}
-    for p in progress_list:
-        ex_name = p["exercise_name"]
-        if p["sets_completed"]:
-            max_weight = max((s.get("weight", 0) for s in p["sets_completed"]), default=0)
-            max_reps = max((s.get("reps", 0) for s in p["sets_completed"]), default=0)
-            
-            if ex_name not in records or max_weight > records[ex_name]["weight"]:
-                records[ex_name] = {
-                    "weight": max_weight,
-                    "reps": max_reps,
-                    "date": p["logged_at"][:10]
-                }
-    
-    return records
+GAMIFICATION_UPDATE_RETRIES = 5
+
+# Per-student gamification state (db.gamification), updated incrementally by log_progress.
+# Exercise names are hashed because they may contain "." or "$".
+
+def exercise_state_key(exercise_name: str) -> str:
+    return hashlib.sha1(exercise_name.encode("utf-8")).hexdigest()[:16]
+
+def empty_gamification_state(student_id: str) -> dict:
+    return {
+        "student_id": student_id,
+        "revision": 0,
+        "total_logs": 0,
+        "exercise_count": 0,
+        "exercises": {},
+        "max_streak": 0,
+        "max_improvement": 0,
+        "badges": {},
+        "updated_at": None,
+    }
+
+def earned_badge_ids(state: dict) -> List[str]:
+    earned = []
+    if state["total_logs"] >= 1:
+        earned.append("first_workout")
+    if state["total_logs"] >= 50:
+        earned.append("workouts_50")
+    if state["total_logs"] >= 100:
+        earned.append("workouts_100")
+    if state["exercise_count"] >= 10:
+        earned.append("exercises_10")
+    for kg in (10, 25):
+        if state["max_improvement"] >= kg:
+            earned.append(f"weight_up_{kg}")
+    return earned
+
+# Used both for incremental updates and for rebuilding from history
+def apply_progress_to_gamification(state: dict, progress_docs: List[dict]) -> dict:
+    for p in progress_docs:
+        state["total_logs"] += 1
+
+        log_date = p["logged_at"][:10]
+        key = exercise_state_key(p["exercise_name"])
+        exercise = state["exercises"].get(key)
+        if exercise is None:
+            exercise = {"name": p["exercise_name"], "first_weight": None, "best_weight": None, "best_reps": None, "best_date": None}
+            state["exercises"][key] = exercise
+            state["exercise_count"] += 1
+
+        sets = p.get("sets_completed") or []
+        if sets:
+            max_weight = max((set_metric(s.get("weight"), float) for s in sets), default=0)
+            max_reps = max((set_metric(s.get("reps"), int) for s in sets), default=0)
+            if exercise["first_weight"] is None:
+                exercise["first_weight"] = max_weight
+            if exercise["best_weight"] is None or max_weight > exercise["best_weight"]:
+                exercise["best_weight"] = max_weight
+                exercise["best_reps"] = max_reps
+                exercise["best_date"] = log_date
+            state["max_improvement"] = max(
+                state["max_improvement"],
+                exercise["best_weight"] - exercise["first_weight"]
+            )
+
+        # Badges are sticky: once earned they keep their first timestamp
+        for badge_id in earned_badge_ids(state):
+            state["badges"].setdefault(badge_id, p["logged_at"])
+
+    return state
+
+# Without earned_at, badges are dated by the day each milestone was first reached
+def apply_activity_to_gamification(state: dict, summary: dict, earned_at: Optional[str] = None) -> dict:
+    state["max_streak"] = max(state["max_streak"], summary["max_streak"])
+    for days in STREAK_MILESTONES:
+        if state["max_streak"] >= days:
+            day = summary["milestones"].get(days, summary["last_active"])
+            state["badges"].setdefault(f"streak_{days}", earned_at or f"{day}T00:00:00+00:00")
+    return state
+
+# Compare-and-swap on revision; expected_revision None inserts after base_revision
+async def save_gamification_state(state: dict, expected_revision: Optional[int], base_revision: int = 0) -> bool:
+    state["revision"] = (expected_revision if expected_revision is not None else base_revision) + 1
+    state["updated_at"] = datetime.now(timezone.utc).isoformat()
+    if expected_revision is None:
+        try:
+            await db.gamification.insert_one(state)
+        except DuplicateKeyError:
+            return False
+        state.pop("_id", None)
+        return True
+    result = await db.gamification.replace_one(
+        {"student_id": state["student_id"], "revision": expected_revision},
+        state
+    )
+    return result.matched_count == 1
+
+async def rebuild_gamification_state(student_id: str) -> dict:
+    for _ in range(GAMIFICATION_UPDATE_RETRIES):
+        current = await db.gamification.find_one({"student_id": student_id}, {"revision": 1})
+        state = empty_gamification_state(student_id)
+        async for p in db.progress.find(
+            {"student_id": student_id},
+            {"_id": 0, "exercise_name": 1, "sets_completed": 1, "logged_at": 1}
+        ).sort("logged_at", 1):
+            apply_progress_to_gamification(state, [p])
+        summary = summarize_activity(await get_activity(student_id))
+        apply_activity_to_gamification(state, summary)
+        base_revision = 0
+        if current is None:
+            # Continue from the leaderboard's revision so its forward-only write accepts this state
+            entry = await db.leaderboard.find_one({"student_id": student_id}, {"_id": 0, "revision": 1})
+            base_revision = (entry or {}).get("revision", 0)
+        if await save_gamification_state(state, current["revision"] if current else None, base_revision):
+            student = await db.users.find_one({"id": student_id, "role": "student"}, {"_id": 0, "id": 1, "name": 1, "personal_id": 1})
+            if student:
+                await sync_leaderboard_entry(student, state, summary)
+            return state
+    raise RuntimeError(f"Estado de gamificação em conflito: {student_id}")
+
+async def get_gamification_state(student_id: str) -> dict:
+    state = await db.gamification.find_one({"student_id": student_id}, {"_id": 0})
+    if state is None:
+        # Students with history from before the state existed
+        state = await rebuild_gamification_state(student_id)
+    return state
+
+async def update_gamification_state(student_id: str, progress_docs: List[dict], summary: dict) -> dict:
+    for _ in range(GAMIFICATION_UPDATE_RETRIES):
+        state = await db.gamification.find_one({"student_id": student_id}, {"_id": 0})
+        if state is None:
+            # The rebuild reads the logs that were just inserted
+            return await rebuild_gamification_state(student_id)
+        revision = state["revision"]
+        apply_progress_to_gamification(state, progress_docs)
+        apply_activity_to_gamification(state, summary, datetime.now(timezone.utc).isoformat())
+        if await save_gamification_state(state, revision):
+            return state
+    raise RuntimeError(f"Estado de gamificação em conflito: {student_id}")
+
+gamification_backfill_state: Dict[str, Any] = {"running": False, "rebuilt": 0, "failed": 0, "finished_at": None}
+
+async def backfill_gamification_state(student_ids: Optional[List[str]] = None):
+    gamification_backfill_state.update({"running": True, "rebuilt": 0, "failed": 0, "finished_at": None})
+    try:
+        if student_ids is None:
+            cursor = db.users.find({"role": "student"}, {"_id": 0, "id": 1})
+            student_ids = [u["id"] async for u in cursor]
+        for student_id in student_ids:
+            try:
+                await rebuild_gamification_state(student_id)
+                gamification_backfill_state["rebuilt"] += 1
+            except Exception as e:
+                gamification_backfill_state["failed"] += 1
+                logger.error("Falha ao reconstruir gamificação de %s: %s", student_id, e)
+    finally:
+        gamification_backfill_state["running"] = False
+        gamification_backfill_state["finished_at"] = datetime.now(timezone.utc).isoformat()
+    logger.info(
+        "Backfill de gamificação concluído: %d reconstruídos, %d falhas",
+        gamification_backfill_state["rebuilt"], gamification_backfill_state["failed"]
+    )
+
+# Leaderboard read model (db.leaderboard), indexed by (personal_id, score desc, student_id)
+
+def leaderboard_score(progress_count: int, streak: int, badges_count: int) -> int:
+    return progress_count * 10 + streak * 5 + badges_count * 20
+
+def new_leaderboard_entry(student: dict) -> dict:
+    return {
+        "student_id": student["id"],
+        "personal_id": student.get("personal_id"),
+        "student_name": student["name"],
+        "revision": 0,
+        "progress_count": 0,
+        "streak": 0,
+        "streak_date": None,
+        "badges_count": 0,
+        "score": 0,
+    }
+
+async def sync_leaderboard_entry(student: dict, state: dict, summary: dict):
+    streak = summary["current_streak"]
+    entry = new_leaderboard_entry(student)
+    entry.update({
+        "revision": state["revision"],
+        "progress_count": state["total_logs"],
+        "streak": streak,
+        # Day the streak was last confirmed; decays once it is in the past
+        "streak_date": summary["last_active"] if streak else None,
+        "badges_count": len(state["badges"]),
+        "score": leaderboard_score(state["total_logs"], streak, len(state["badges"])),
+    })
+    try:
+        # Only move forward: a slower concurrent write of an older revision
+        # hits the unique student_id index instead of overwriting.
+        await db.leaderboard.replace_one(
+            {"student_id": student["id"], "revision": {"$lt": state["revision"]}},
+            entry,
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+async def decay_leaderboard_streaks(personal_id: Optional[str] = None) -> int:
+    today = datetime.now(timezone.utc).date().isoformat()
+    query: Dict[str, Any] = {"streak_date": {"$lt": today}}
+    if personal_id:
+        query["personal_id"] = personal_id
+    stale = await db.leaderboard.find(
+        query,
+        {"_id": 0, "student_id": 1, "streak_date": 1, "progress_count": 1, "badges_count": 1}
+    ).to_list(None)
+    if not stale:
+        return 0
+    operations = [
+        UpdateOne(
+            # Skip entries a new progress log refreshed in the meantime
+            {"student_id": e["student_id"], "streak_date": e["streak_date"]},
+            {"$set": {
+                "streak": 0,
+                "streak_date": None,
+                "score": leaderboard_score(e["progress_count"], 0, e["badges_count"]),
+            }}
+        )
+        for e in stale
+    ]
+    result = await db.leaderboard.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+async def backfill_leaderboard():
+    student_ids = [u["id"] async for u in db.users.find({"role": "student"}, {"_id": 0, "id": 1})]
+    ranked = {e["student_id"] async for e in db.leaderboard.find({}, {"_id": 0, "student_id": 1})}
+    missing = [student_id for student_id in student_ids if student_id not in ranked]
+    if missing:
+        await backfill_gamification_state(missing)
+
+def badges_from_state(state: dict) -> list:
+    return [
+        {**BADGES[badge_id], "earned_at": state["badges"][badge_id]}
+        for badge_id in BADGE_ORDER
+        if badge_id in state["badges"]
+    ]
+
+def records_from_state(state: dict) -> dict:
+    return {
+        exercise["name"]: {
+            "weight": exercise["best_weight"],
+            "reps": exercise["best_reps"],
+            "date": exercise["best_date"]
+        }
+        for exercise in state["exercises"].values()
+        if exercise["best_weight"] is not None
+    }
 
 @api_router.get("/gamification/badges")
 async def get_badges(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "student":
         raise HTTPException(status_code=403, detail="Apenas para alunos")
     
-    badges = await calculate_badges(current_user["id"])
+    state = await get_gamification_state(current_user["id"])
+    badges = badges_from_state(state)
     return {
         "earned": badges,
         "total_available": len(BADGES),
@@ -2695,54 +4877,61 @@ async def get_records(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "student":
         raise HTTPException(status_code=403, detail="Apenas para alunos")
     
-    records = await calculate_records(current_user["id"])
-    return records
+    state = await get_gamification_state(current_user["id"])
+    return records_from_state(state)
 
 @api_router.get("/gamification/ranking")
-async def get_ranking(personal: dict = Depends(get_personal_user)):
-    students = await db.users.find(
-        {"personal_id": personal["id"], "role": "student"},
-        {"_id": 0, "password": 0}
-    ).to_list(100)
+async def get_ranking(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    personal: dict = Depends(get_personal_user)
+):
+    await decay_leaderboard_streaks(personal["id"])
     
-    ranking = []
-    for student in students:
-        progress_count = await db.progress.count_documents({"student_id": student["id"]})
-        
-        progress_list = await db.progress.find(
-            {"student_id": student["id"]},
-            {"logged_at": 1}
-        ).sort("logged_at", -1).to_list(100)
-        
-        streak = 0
-        if progress_list:
-            dates = sorted(set(p["logged_at"][:10] for p in progress_list), reverse=True)
-            today = datetime.now(timezone.utc).date()
-            
-            for i, date_str in enumerate(dates):
-                check_date = today - timedelta(days=i)
-                if date_str == check_date.isoformat():
-                    streak += 1
-                else:
-                    break
-        
-        badges = await calculate_badges(student["id"])
-        
-        ranking.append({
-            "student_id": student["id"],
-            "student_name": student["name"],
-            "progress_count": progress_count,
-            "streak": streak,
-            "badges_count": len(badges),
-            "score": progress_count * 10 + streak * 5 + len(badges) * 20
-        })
+    entries = await db.leaderboard.find(
+        {"personal_id": personal["id"]},
+        {"_id": 0, "personal_id": 0, "revision": 0, "streak_date": 0}
+    ).sort([("score", -1), ("student_id", 1)]).skip(offset).limit(limit).to_list(limit)
     
-    ranking.sort(key=lambda x: x["score"], reverse=True)
+    for i, entry in enumerate(entries):
+        entry["rank"] = offset + i + 1
     
-    for i, r in enumerate(ranking):
-        r["rank"] = i + 1
+    return entries
+
+@api_router.get("/gamification/ranking/position")
+async def get_ranking_position(
+    student_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] == "student":
+        personal_id = current_user.get("personal_id")
+        student_id = current_user["id"]
+    elif current_user["role"] == "personal":
+        if not student_id:
+            raise HTTPException(status_code=400, detail="student_id é obrigatório para personal")
+        personal_id = current_user["id"]
+    else:
+        raise HTTPException(status_code=403, detail="Acesso negado")
     
-    return ranking
+    await decay_leaderboard_streaks(personal_id)
+    entry = await db.leaderboard.find_one(
+        {"student_id": student_id, "personal_id": personal_id},
+        {"_id": 0, "personal_id": 0, "revision": 0, "streak_date": 0}
+    )
+    if not entry:
+        raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    
+    # Same ordering as the ranking: score desc, then student_id
+    ahead = await db.leaderboard.count_documents({
+        "personal_id": personal_id,
+        "$or": [
+            {"score": {"$gt": entry["score"]}},
+            {"score": entry["score"], "student_id": {"$lt": student_id}},
+        ]
+    })
+    entry["rank"] = ahead + 1
+    entry["total"] = await db.leaderboard.count_documents({"personal_id": personal_id})
+    return entry
 
 @api_router.get("/gamification/student/{student_id}")
 async def get_student_gamification(student_id: str, personal: dict = Depends(get_personal_user)):
@@ -2753,8 +4942,9 @@ async def get_student_gamification(student_id: str, personal: dict = Depends(get
     if not student:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
     
-    badges = await calculate_badges(student_id)
-    records = await calculate_records(student_id)
+    state = await get_gamification_state(student_id)
+    badges = badges_from_state(state)
+    records = records_from_state(state)
     
     return {
         "student": student,
@@ -2764,6 +4954,180 @@ async def get_student_gamification(student_id: str, personal: dict = Depends(get
         "total_badges": len(BADGES)
     }
 
+@api_router.post("/admin/gamification/rebuild")
+async def rebuild_gamification(student_id: Optional[str] = None, admin: dict = Depends(get_admin_user)):
+    if student_id:
+        state = await rebuild_gamification_state(student_id)
+        return {"student_id": student_id, "revision": state["revision"], "badges_count": len(state["badges"])}
+    if gamification_backfill_state["running"]:
+        raise HTTPException(status_code=409, detail="Reconstrução já em andamento")
+    start_background_task(backfill_gamification_state())
+    return {"message": "Reconstrução iniciada"}
+
+# ==================== DATABASE INDEXES ====================
+
+# Created at startup with default names, so matching hand-made indexes are reused
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", 1)], unique=True),
+        USERS_EMAIL_INDEX,
+        IndexModel([("personal_id", 1), ("role", 1)]),
+        IndexModel([("role", 1), ("is_approved", 1), ("created_at", 1)]),
+    ],
+    "workouts": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("student_id", 1), ("archived", 1), ("created_at", -1)]),
+        IndexModel([("personal_id", 1), ("archived", 1), ("created_at", -1)]),
+        IndexModel([("student_id", 1), ("personal_id", 1), ("routine_id", 1), ("version", -1)]),
+        IndexModel([("routine_id", 1)]),
+    ],
+    "progress": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("student_id", 1), ("exercise_name", 1), ("logged_at", -1)]),
+        IndexModel([("student_id", 1), ("logged_at", -1)]),
+        IndexModel([("student_id", 1), ("workout_id", 1), ("day_name", 1), ("logged_at", -1)]),
+        IndexModel([("student_id", 1), ("synced_at", 1), ("id", 1)]),
+        IndexModel(
+            [("student_id", 1), ("client_op_id", 1)],
+            unique=True,
+            partialFilterExpression={"client_op_id": {"$exists": True}}
+        ),
+    ],
+    "messages": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("sender_id", 1), ("receiver_id", 1), ("created_at", -1), ("id", -1)]),
+        IndexModel([("sender_id", 1), ("receiver_id", 1), ("read", 1)]),
+    ],
+    "conversations": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("participants", 1)]),
+    ],
+    "payments": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("due_date", -1)]),
+        IndexModel([("student_id", 1), ("due_date", -1)]),
+        IndexModel(
+            [("plan_id", 1), ("period", 1)],
+            unique=True,
+            partialFilterExpression={"period": {"$exists": True}}
+        ),
+        IndexModel([("status", 1), ("due_date", 1)]),
+        IndexModel([("overdue_sweep_id", 1)], sparse=True),
+    ],
+    "plans": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("student_id", 1)]),
+        IndexModel([("status", 1)]),
+    ],
+    "checkins": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("student_id", 1), ("check_in_time", -1)]),
+    ],
+    "notifications": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("user_id", 1), ("created_at", -1)]),
+    ],
+    "routines": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("created_at", -1)]),
+        IndexModel([("student_id", 1), ("created_at", -1)]),
+    ],
+    "assessments": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("date", -1)]),
+        IndexModel([("student_id", 1), ("date", -1)]),
+    ],
+    "exercise_library": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("name", 1)]),
+        IndexModel([("search_tokens", 1), ("personal_id", 1)]),
+    ],
+    "evolution_photos": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("student_id", 1), ("date", -1)]),
+    ],
+    "gamification": [
+        IndexModel([("student_id", 1)], unique=True),
+    ],
+    "progress_daily": [
+        IndexModel([("student_id", 1), ("exercise_name", 1), ("day", 1)], unique=True),
+        IndexModel([("student_id", 1), ("day", -1)]),
+    ],
+    "session_accumulators": [
+        IndexModel([("student_id", 1), ("workout_id", 1), ("day_name", 1)], unique=True),
+    ],
+    "progress_rollup_status": [
+        IndexModel([("student_id", 1)], unique=True),
+    ],
+    "activity": [
+        IndexModel([("student_id", 1)], unique=True),
+    ],
+    "catalog_revisions": [
+        IndexModel([("scope", 1)], unique=True),
+    ],
+    "leaderboard": [
+        IndexModel([("student_id", 1)], unique=True),
+        IndexModel([("personal_id", 1), ("score", -1), ("student_id", 1)]),
+        IndexModel([("personal_id", 1), ("streak_date", 1)]),
+        IndexModel([("streak_date", 1)]),
+    ],
+    "workout_sessions": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("student_id", 1), ("workout_id", 1), ("day_name", 1), ("completed_at", -1)]),
+        IndexModel([("student_id", 1), ("completed_at", -1)]),
+        IndexModel([("student_id", 1), ("synced_at", 1), ("id", 1)]),
+        IndexModel(
+            [("student_id", 1), ("client_op_id", 1)],
+            unique=True,
+            partialFilterExpression={"client_op_id": {"$exists": True}}
+        ),
+    ],
+}
+
+async def ensure_indexes():
+    for collection_name, models in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except PyMongoError:
+            # Retry one by one so a single conflicting index does not keep the
+            # rest of the collection unindexed.
+            for model in models:
+                try:
+                    await collection.create_indexes([model])
+                except PyMongoError as e:
+                    logger.error("Falha ao criar indice %s.%s: %s", collection_name, model.document["name"], e)
+
+@api_router.get("/admin/indexes")
+async def get_index_report(admin: dict = Depends(get_admin_user)):
+    report = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        usage = {}
+        try:
+            async for stat in collection.aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat.get("accesses", {})
+        except PyMongoError as e:
+            logger.warning("$indexStats indisponivel para %s: %s", collection_name, e)
+
+        declared = {model.document["name"] for model in models}
+        report[collection_name] = {
+            "indexes": [
+                {
+                    "name": name,
+                    "key": [list(k) for k in info.get("key", [])],
+                    "unique": info.get("unique", False),
+                    "declared": name in declared,
+                    "ops": usage.get(name, {}).get("ops"),
+                    "since": usage.get(name, {}).get("since"),
+                }
+                for name, info in existing.items()
+            ],
+            "missing": sorted(declared - set(existing)),
+        }
+    return report
+
 # ==================== ROOT ====================
 
 @api_router.get("/")
@@ -2781,8 +5145,9 @@ async def ensure_master_admin_user():
     admin_doc = {
         "id": admin_user["id"] if admin_user else str(uuid.uuid4()),
         "email": MASTER_ADMIN_EMAIL,
+        "email_lower": normalize_email(MASTER_ADMIN_EMAIL),
         "name": MASTER_ADMIN_NAME,
-        "password": hash_password(MASTER_ADMIN_PASSWORD),
+        "password": await password_hasher.hash(MASTER_ADMIN_PASSWORD),
         "role": "administrador",
         "is_approved": True,
         "approved_at": now,
@@ -2795,6 +5160,7 @@ async def ensure_master_admin_user():
             {"id": admin_user["id"]},
             {"$set": admin_doc}
         )
+        user_cache.invalidate(admin_user["id"])
         logger.info("Conta administrador atualizada: %s", MASTER_ADMIN_EMAIL)
     else:
         await db.users.insert_one(admin_doc)
@@ -2809,12 +5175,54 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+background_tasks: set = set()
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error("Tarefa em segundo plano falhou: %s", task.exception())
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+async def run_periodically(name: str, interval_seconds: float, job):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Tarefa periodica %s falhou: %s", name, e)
+        await asyncio.sleep(interval_seconds)
+
 @app.on_event("startup")
 async def startup_initialize():
+    await event_hub.start()
+    await ensure_indexes()
     await ensure_master_admin_user()
+    start_background_task(backfill_user_email_lower())
+    start_background_task(backfill_leaderboard())
+    start_background_task(backfill_progress_rollups())
+    start_background_task(backfill_library_search_tokens())
+    start_background_task(sheet_parser_pool.warm_up())
+    if LEADERBOARD_DECAY_INTERVAL_SECONDS > 0:
+        start_background_task(run_periodically("leaderboard_decay", LEADERBOARD_DECAY_INTERVAL_SECONDS, decay_leaderboard_streaks))
+    if OVERDUE_SWEEP_INTERVAL_SECONDS > 0:
+        start_background_task(run_periodically("overdue_sweep", OVERDUE_SWEEP_INTERVAL_SECONDS, sweep_overdue_payments))
+    if BILLING_AUTO_GENERATE_INTERVAL_SECONDS > 0:
+        start_background_task(run_periodically("billing", BILLING_AUTO_GENERATE_INTERVAL_SECONDS, run_scheduled_billing))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(background_tasks):
+        task.cancel()
+    await event_hub.stop()
     client.close()
+    password_hasher.shutdown()
+    sheet_parser_pool.shutdown()
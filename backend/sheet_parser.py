@@ -0,0 +1,245 @@
+"""Workout spreadsheet parsing.
+
+Runs in the sheet parsing process pool (see SheetParserPool in server.py), so
+this module must stay importable on its own: no database, no app state, only
+pandas work on the uploaded bytes.
+"""
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+class SheetParseError(Exception):
+    """A sheet that cannot be turned into a workout; the message is shown to the user."""
+
+def normalize_sheet_column(name: str) -> str:
+    text = str(name or "").strip().lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def clean_sheet_value(value: Any) -> str:
+    if value is None:
+        return ""
+    try:
+        if pd.isna(value):
+            return ""
+    except TypeError:
+        pass
+    text = str(value).strip()
+    if text.lower() == "nan":
+        return ""
+    return text
+
+def to_int_or_default(value: Any, default: int = 3) -> int:
+    text = clean_sheet_value(value).replace(",", ".")
+    if not text:
+        return default
+    try:
+        parsed = int(float(text))
+        return parsed if parsed > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+def resolve_sheet_column(normalized_columns: Dict[str, str], aliases: List[str]) -> Optional[str]:
+    for alias in aliases:
+        alias_key = normalize_sheet_column(alias)
+        if alias_key in normalized_columns:
+            return normalized_columns[alias_key]
+    return None
+
+def clean_sheet_column(column: pd.Series) -> pd.Series:
+    """clean_sheet_value over a whole column."""
+    column = column.astype(object)
+    text = column.map(str).str.strip()
+    empty = column.isna().to_numpy() | (text.str.lower() == "nan").to_numpy()
+    text[empty] = ""
+    return text
+
+# First two numbers of an interval, as re.findall would return them
+REST_TIME_NUMBERS = r"(\d+(?:\.\d+)?)(?:\D*(\d+(?:\.\d+)?))?"
+
+def parse_rest_time_column(intervals: pd.Series, default_seconds: int = 90) -> pd.Series:
+    """Rest time in seconds for a column of cleaned interval values ("90s",
+    "1-2 min", "1,5"); bare numbers up to 10 are minutes."""
+    normalized = intervals.str.lower()
+    for dash in ("–", "—", "−", "\x96"):
+        normalized = normalized.str.replace(dash, "-", regex=False)
+    normalized = normalized.str.replace(",", ".", regex=False)
+
+    numbers = normalized.str.extract(REST_TIME_NUMBERS).astype(float)
+    first, second = numbers[0], numbers[1]
+    base_value = first.where(second.isna(), (first + second) / 2)
+
+    is_minutes = (
+        normalized.str.contains("min", regex=False)
+        | normalized.str.contains(r"\d+\s*m\b", regex=True)
+        | (~normalized.str.contains("s", regex=False) & (base_value <= 10))
+    )
+    # np.round rounds half to even, like round()
+    seconds = pd.Series(np.where(is_minutes, np.round(base_value * 60), np.round(base_value)), index=intervals.index)
+    seconds = seconds.where(seconds > 0, default_seconds)
+    return seconds.astype(int)
+
+def map_unique(column: pd.Series, func) -> pd.Series:
+    # Sheets repeat the same exercise names and set counts on many rows, so
+    # the per-value lookups run once per distinct value
+    return column.map({value: func(value) for value in column.unique()})
+
+def parse_workout_days(df: pd.DataFrame, sheet_columns: Dict[str, Optional[str]]) -> List[dict]:
+    """Build the workout days from a sheet. Column-wise equivalent of
+    walking the rows with iterrows()."""
+    if df.empty:
+        return []
+    # Values as iterrows() yields them (DataFrame.values), so mixed numeric
+    # columns are upcast the same way
+    values = df.values
+    labels = list(df.columns)
+
+    def column(key: str, rows=slice(None)) -> Optional[pd.Series]:
+        name = sheet_columns.get(key)
+        if not name:
+            return None
+        return clean_sheet_column(pd.Series(values[rows, labels.index(name)], dtype=object))
+
+    day_names = column("day")
+    exercise_names = column("exercise")
+    # Ignore spacing/placeholder rows from spreadsheet templates.
+    keep = ((day_names != "") & (exercise_names != "")).to_numpy()
+    if not keep.any():
+        return []
+
+    def kept(key: str) -> Optional[pd.Series]:
+        # Only the rows that survive are cleaned
+        return column(key, keep)
+
+    day_names = day_names[keep].reset_index(drop=True)
+    exercise_names = exercise_names[keep].reset_index(drop=True)
+    blank = pd.Series("", index=day_names.index, dtype=object)
+
+    reps = kept("reps")
+    reps = reps.where(reps != "", "10-12")
+    intervals = kept("interval")
+    intervals = blank if intervals is None else intervals
+    methods = kept("method")
+    methods = blank if methods is None else methods
+    notes = kept("notes")
+    notes = blank if notes is None else notes
+    descriptions = kept("description")
+    descriptions = blank if descriptions is None else descriptions
+    videos = kept("video")
+    videos = blank if videos is None else videos
+    muscles = kept("muscle")
+    muscles = blank if muscles is None else muscles
+    weights = kept("weight")
+    sets = kept("sets")
+    sets = map_unique(sets, lambda value: to_int_or_default(value, 3)) if sets is not None else pd.Series(3, index=day_names.index)
+
+    merged = descriptions.copy()
+    method_part = "Método: " + methods
+    interval_part = "Intervalo: " + intervals
+    for part, present in ((method_part, methods != ""), (interval_part, intervals != "")):
+        merged = merged.where(~present, merged.where(merged == "", merged + " | ") + part)
+
+    distinct_intervals = pd.Series(intervals.unique(), dtype=object)
+    rest_times = intervals.map(dict(zip(distinct_intervals, parse_rest_time_column(distinct_intervals, default_seconds=90))))
+
+    days_map: Dict[str, List[Dict[str, Any]]] = {}
+    for row in zip(
+        day_names, exercise_names, muscles, sets, reps,
+        weights if weights is not None else [None] * len(day_names),
+        notes, videos, merged, rest_times
+    ):
+        day_name, name, muscle, set_count, rep_text, weight, note, video, description, rest = row
+        days_map.setdefault(day_name, []).append({
+            "name": name,
+            "muscle_group": muscle,
+            "sets": int(set_count),
+            "reps": rep_text,
+            "weight": weight or None,
+            "notes": note or None,
+            # Filled in by the API process, which owns the exercise catalog
+            "image_url": None,
+            "video_url": video or None,
+            "description": description or None,
+            "rest_time": int(rest),
+        })
+
+    return [
+        {"day_name": day_name, "exercises": exercises}
+        for day_name, exercises in days_map.items()
+        if exercises
+    ]
+
+def read_sheet(content: bytes, filename_lower: str) -> pd.DataFrame:
+    if filename_lower.endswith(".csv"):
+        try:
+            return pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            try:
+                return pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="cp1252")
+            except UnicodeDecodeError:
+                return pd.read_csv(BytesIO(content), sep=None, engine="python", encoding="latin-1")
+    return pd.read_excel(BytesIO(content))
+
+def parse_sheet(content: bytes, filename_lower: str) -> List[dict]:
+    """Read an uploaded .csv/.xls/.xlsx and return its workout days."""
+    try:
+        df = read_sheet(content, filename_lower)
+    except pd.errors.EmptyDataError:
+        raise SheetParseError("Arquivo vazio ou inválido")
+
+    df.columns = [clean_sheet_value(col) for col in df.columns]
+    normalized_columns: Dict[str, str] = {}
+    for col in df.columns:
+        key = normalize_sheet_column(col)
+        if key and key not in normalized_columns:
+            normalized_columns[key] = col
+
+    day_col = resolve_sheet_column(normalized_columns, ["TREINO", "Dia"])
+    exercise_col = resolve_sheet_column(normalized_columns, ["EXERCÍCIO", "Exercicio"])
+    reps_col = resolve_sheet_column(normalized_columns, ["REPETIÇÕES", "Repeticoes", "Reps"])
+
+    missing_required = []
+    if not day_col:
+        missing_required.append("TREINO")
+    if not exercise_col:
+        missing_required.append("EXERCÍCIO")
+    if not reps_col:
+        missing_required.append("REPETIÇÕES")
+
+    if missing_required:
+        found_columns = ", ".join(df.columns.tolist()) or "(nenhuma coluna)"
+        raise SheetParseError(
+            f"Colunas obrigatórias não encontradas: {', '.join(missing_required)}. "
+            f"Colunas encontradas: {found_columns}"
+        )
+
+    return parse_workout_days(df, {
+        "day": day_col,
+        "exercise": exercise_col,
+        "reps": reps_col,
+        "muscle": resolve_sheet_column(normalized_columns, ["GRUPO MUSCULAR", "Grupo Muscular"]),
+        "sets": resolve_sheet_column(normalized_columns, ["SÉRIES", "Series"]),
+        "weight": resolve_sheet_column(normalized_columns, ["CARGA (ALUNO)", "Carga Aluno", "CARGA"]),
+        "interval": resolve_sheet_column(normalized_columns, ["INTERVALO", "Descanso"]),
+        "notes": resolve_sheet_column(normalized_columns, ["OBSERVAÇÃO", "OBSERVAÇÕES", "Observacao", "Observacoes"]),
+        "method": resolve_sheet_column(normalized_columns, ["MÉTODO", "Metodo"]),
+        "video": resolve_sheet_column(normalized_columns, ["VÍDEO", "VIDEO", "Link Vídeo", "Link Video"]),
+        "description": resolve_sheet_column(normalized_columns, ["DESCRIÇÃO", "Descricao"]),
+    })
+
+def report_worker_pid(worker_pids) -> None:
+    # Pool initializer: lets the API process kill a worker stuck on a sheet
+    worker_pids.put(os.getpid())
+
+def warm_up() -> bool:
+    # Submitted once at startup so the first upload doesn't pay for
+    # starting a worker and importing pandas
+    return True
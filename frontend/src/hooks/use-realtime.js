@@ -0,0 +1,51 @@
+import { useEffect, useRef } from "react";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Subscribes to events pushed by the backend over /api/ws
+// ({ type: "message" | "notification", data }). Reconnects with backoff;
+// pages keep a slow REST poll as a fallback.
+export function useRealtime(onEvent) {
+  const handlerRef = useRef(onEvent);
+  handlerRef.current = onEvent;
+
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token) return undefined;
+
+    const base = (BACKEND_URL || window.location.origin).replace(/^http/, "ws");
+    let socket = null;
+    let retry = 0;
+    let timer = null;
+    let closed = false;
+
+    const connect = () => {
+      socket = new WebSocket(`${base}/api/ws`);
+      socket.onopen = () => {
+        retry = 0;
+        // Sent as the first message rather than in the URL, which ends up in access logs
+        socket.send(JSON.stringify({ type: "auth", token }));
+      };
+      socket.onmessage = (event) => {
+        try {
+          handlerRef.current?.(JSON.parse(event.data));
+        } catch (error) {
+          console.error("Error handling realtime event:", error);
+        }
+      };
+      socket.onclose = (event) => {
+        // 44xx: rejected token, do not hammer the server
+        if (closed || (event.code >= 4400 && event.code < 4500)) return;
+        timer = setTimeout(connect, Math.min(30000, 1000 * 2 ** retry));
+        retry += 1;
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      socket?.close();
+    };
+  }, []);
+}
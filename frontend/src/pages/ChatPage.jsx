@@ -7,6 +7,7 @@ import { Input } from "../components/ui/input";
 import { ScrollArea } from "../components/ui/scroll-area";
 import { MessageCircle, Send, User, ArrowLeft } from "lucide-react";
 import api from "../lib/api";
+import { useRealtime } from "../hooks/use-realtime";
 import { toast } from "sonner";
 
 export default function ChatPage() {
@@ -19,6 +20,8 @@ export default function ChatPage() {
   const [sending, setSending] = useState(false);
   const messagesEndRef = useRef(null);
   const pollIntervalRef = useRef(null);
+  const activeUserRef = useRef(null);
+  const lastCursorRef = useRef(null);
 
   useEffect(() => {
     loadConversations();
@@ -29,11 +32,13 @@ export default function ChatPage() {
 
   useEffect(() => {
     if (selectedConversation) {
+      activeUserRef.current = selectedConversation.user_id;
       loadMessages(selectedConversation.user_id);
-      // Poll for new messages every 5 seconds
+      // New messages arrive over the realtime socket; this slow poll only
+      // covers a dropped connection
       pollIntervalRef.current = setInterval(() => {
-        loadMessages(selectedConversation.user_id);
-      }, 5000);
+        loadNewMessages(selectedConversation.user_id);
+      }, 30000);
     }
     return () => {
       if (pollIntervalRef.current) clearInterval(pollIntervalRef.current);
@@ -59,10 +64,51 @@ export default function ChatPage() {
     }
   };
 
+  useRealtime((event) => {
+    if (event.type !== "message") return;
+    const msg = event.data;
+    const otherId = msg.sender_id === user?.id ? msg.receiver_id : msg.sender_id;
+    if (otherId !== activeUserRef.current) {
+      loadConversations();
+      return;
+    }
+    // Fetch through the cursor so the message is also marked as read
+    loadNewMessages(otherId);
+  });
+
+  // Cursor of a message for incremental sync: "<created_at>|<id>"
+  const messageCursor = (msg) => `${msg.created_at}|${msg.id}`;
+
   const loadMessages = async (userId) => {
     try {
       const response = await api.get(`/chat/messages/${userId}`);
+      if (activeUserRef.current !== userId) return;
       setMessages(response.data);
+      const last = response.data[response.data.length - 1];
+      lastCursorRef.current = last ? messageCursor(last) : null;
+    } catch (error) {
+      console.error("Error loading messages:", error);
+    }
+  };
+
+  // Only fetch messages newer than the last one already on screen
+  const loadNewMessages = async (userId) => {
+    if (!lastCursorRef.current) {
+      return loadMessages(userId);
+    }
+    try {
+      const response = await api.get(`/chat/messages/${userId}`, {
+        params: { after: lastCursorRef.current }
+      });
+      if (activeUserRef.current !== userId || response.data.length === 0) return;
+      // The sender also gets its own "message" event, so two fetches from
+      // the same cursor can race; keep each message once
+      setMessages((prev) => {
+        const seen = new Set(prev.map((m) => m.id));
+        const fresh = response.data.filter((m) => !seen.has(m.id));
+        return fresh.length ? [...prev, ...fresh] : prev;
+      });
+      lastCursorRef.current = messageCursor(response.data[response.data.length - 1]);
     } catch (error) {
       console.error("Error loading messages:", error);
     }
@@ -79,7 +125,7 @@ export default function ChatPage() {
         content: newMessage.trim()
       });
       setNewMessage("");
-      loadMessages(selectedConversation.user_id);
+      loadNewMessages(selectedConversation.user_id);
     } catch (error) {
       toast.error("Erro ao enviar mensagem");
     } finally {
@@ -68,7 +68,7 @@ export default function ExerciseLibraryPage() {
       let url = "/exercise-library";
       const params = [];
       if (selectedCategory) params.push(`category=${selectedCategory}`);
-      if (searchTerm) params.push(`search=${searchTerm}`);
+      if (searchTerm) params.push(`search=${encodeURIComponent(searchTerm)}`);
       if (params.length > 0) url += `?${params.join("&")}`;
 
       const response = await api.get(url);
@@ -4,6 +4,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "../components/ui/card"
 import { Button } from "../components/ui/button";
 import { Bell, CheckCheck, Dumbbell, Info, CheckCircle } from "lucide-react";
 import api from "../lib/api";
+import { useRealtime } from "../hooks/use-realtime";
 import { toast } from "sonner";
 
 export default function NotificationsPage() {
@@ -14,6 +15,13 @@ export default function NotificationsPage() {
     loadNotifications();
   }, []);
 
+  useRealtime((event) => {
+    if (event.type !== "notification") return;
+    setNotifications((prev) =>
+      prev.some((n) => n.id === event.data.id) ? prev : [event.data, ...prev]
+    );
+  });
+
   const loadNotifications = async () => {
     try {
       const response = await api.get("/notifications");
@@ -71,7 +71,7 @@ export default function WorkoutsPage() {
     try {
       const [studentsRes, workoutsRes] = await Promise.all([
         api.get("/students"),
-        api.get("/workouts")
+        api.get("/workouts?view=summary")
       ]);
       setStudents(studentsRes.data);
       setWorkouts(workoutsRes.data);
@@ -84,7 +84,7 @@ export default function WorkoutsPage() {
 
   const loadWorkouts = async (studentId = null) => {
     try {
-      const url = studentId ? `/workouts?student_id=${studentId}` : "/workouts";
+      const url = studentId ? `/workouts?view=summary&student_id=${studentId}` : "/workouts?view=summary";
       const response = await api.get(url);
       setWorkouts(response.data);
     } catch (error) {
@@ -92,6 +92,24 @@ export default function WorkoutsPage() {
     }
   };
 
+  // The list only carries per-day counts; exercises come from the full workout
+  const loadWorkoutDetails = async (workoutId) => {
+    try {
+      const response = await api.get(`/workouts/${workoutId}`);
+      setSelectedWorkout(response.data);
+    } catch (error) {
+      toast.error("Erro ao carregar treino");
+    }
+  };
+
+  const toggleWorkoutDetails = (workout) => {
+    if (selectedWorkout?.id === workout.id) {
+      setSelectedWorkout(null);
+    } else {
+      loadWorkoutDetails(workout.id);
+    }
+  };
+
   const handleFileUpload = async (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
@@ -320,7 +338,7 @@ export default function WorkoutsPage() {
                       <Button 
                         variant="outline" 
                         size="sm"
-                        onClick={() => setSelectedWorkout(selectedWorkout?.id === workout.id ? null : workout)}
+                        onClick={() => toggleWorkoutDetails(workout)}
                         data-testid={`view-workout-${workout.id}`}
                       >
                         <Eye className="w-4 h-4 mr-1" />
@@ -350,9 +368,9 @@ export default function WorkoutsPage() {
                     {/* Workout Details */}
                     {selectedWorkout?.id === workout.id && (
                       <div className="mt-4 pt-4 border-t border-border animate-slide-up">
-                        <Tabs defaultValue={workout.days?.[0]?.day_name}>
+                        <Tabs defaultValue={selectedWorkout.days?.[0]?.day_name}>
                           <TabsList className="flex overflow-x-auto gap-1 bg-secondary/30 p-1 rounded-lg mb-4">
-                            {workout.days?.map((day) => (
+                            {selectedWorkout.days?.map((day) => (
                               <TabsTrigger
                                 key={day.day_name}
                                 value={day.day_name}
@@ -362,7 +380,7 @@ export default function WorkoutsPage() {
                               </TabsTrigger>
                             ))}
                           </TabsList>
-                          {workout.days?.map((day, dayIdx) => (
+                          {selectedWorkout.days?.map((day, dayIdx) => (
                             <TabsContent key={day.day_name} value={day.day_name}>
                               <div className="space-y-2">
                                 {day.exercises?.map((exercise, idx) => (
@@ -438,8 +456,8 @@ export default function WorkoutsPage() {
             exerciseName={imageUploadDialog.exerciseName}
             currentImage={imageUploadDialog.currentImage}
             onImageUpdated={(newUrl) => {
-              // Refresh workouts to show new image
-              loadWorkouts(selectedStudent !== "none" ? selectedStudent : null);
+              // Refresh the open workout to show new image
+              loadWorkoutDetails(imageUploadDialog.workoutId);
             }}
           />
         )}
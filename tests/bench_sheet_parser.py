@@ -0,0 +1,44 @@
+"""Benchmark the column-wise sheet parser against the row-wise one.
+
+    python tests/bench_sheet_parser.py [rows] [repeats]
+
+Times parse_workout_days (column-wise) and the old iterrows loop on the same
+generated sheet, plus the whole parse_sheet for csv and xlsx, and checks the
+two parsers agree.
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from test_sheet_parser import (  # noqa: E402
+    TEMPLATE_COLUMNS, as_json, make_sheet, resolve_columns, rowwise_parse_workout_days, sheet_bytes, sheet_parser,
+)
+
+def best_of(repeats: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings) * 1000
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    df = make_sheet(random.Random(0), rows, TEMPLATE_COLUMNS)
+    columns = resolve_columns(df)
+    if as_json(sheet_parser.parse_workout_days(df, columns)) != as_json(rowwise_parse_workout_days(df, columns)):
+        sys.exit("column-wise and row-wise parsers disagree")
+
+    print(f"{rows} rows, best of {repeats}")
+    print(f"  row-wise parse     {best_of(repeats, rowwise_parse_workout_days, df, columns):8.1f} ms")
+    print(f"  column-wise parse  {best_of(repeats, sheet_parser.parse_workout_days, df, columns):8.1f} ms")
+    for fmt in ("csv", "xlsx"):
+        content = sheet_bytes(df, fmt)
+        print(f"  parse_sheet {fmt:<5}  {best_of(repeats, sheet_parser.parse_sheet, content, f'treino.{fmt}'):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
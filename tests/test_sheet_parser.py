@@ -0,0 +1,219 @@
+"""Parity of the column-wise sheet parser with the row-wise one it replaced.
+
+rowwise_parse_workout_days is the old /workouts/upload loop over
+df.iterrows(), minus the image/video catalog lookups that now run in the API
+process after parsing.
+"""
+import json
+import random
+import re
+import sys
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import sheet_parser  # noqa: E402
+from sheet_parser import clean_sheet_value, to_int_or_default  # noqa: E402
+
+# ==================== ROW-WISE REFERENCE ====================
+
+def rowwise_parse_rest_time_seconds(interval_value: Any, default_seconds: int = 90) -> int:
+    text = clean_sheet_value(interval_value).lower()
+    if not text:
+        return default_seconds
+
+    normalized = (
+        text.replace("–", "-")
+        .replace("—", "-")
+        .replace("−", "-")
+        .replace("\x96", "-")
+        .replace(",", ".")
+    )
+
+    matches = re.findall(r"\d+(?:\.\d+)?", normalized)
+    if not matches:
+        return default_seconds
+
+    values = [float(v) for v in matches]
+    base_value = values[0] if len(values) == 1 else (values[0] + values[1]) / 2
+
+    is_minutes = any(token in normalized for token in ["min", "mins", "minute"])
+    if not is_minutes and re.search(r"\d+\s*m\b", normalized):
+        is_minutes = True
+    if not is_minutes and "s" not in normalized and base_value <= 10:
+        is_minutes = True
+
+    seconds = int(round(base_value * 60)) if is_minutes else int(round(base_value))
+    return seconds if seconds > 0 else default_seconds
+
+def rowwise_parse_workout_days(df: pd.DataFrame, sheet_columns: Dict[str, Optional[str]]) -> List[dict]:
+    day_col = sheet_columns["day"]
+    exercise_col = sheet_columns["exercise"]
+    reps_col = sheet_columns["reps"]
+    muscle_col = sheet_columns.get("muscle")
+    sets_col = sheet_columns.get("sets")
+    weight_col = sheet_columns.get("weight")
+    interval_col = sheet_columns.get("interval")
+    notes_col = sheet_columns.get("notes")
+    method_col = sheet_columns.get("method")
+    video_col = sheet_columns.get("video")
+    description_col = sheet_columns.get("description")
+
+    days_map: Dict[str, List[Dict[str, Any]]] = {}
+    for _, row in df.iterrows():
+        day_name = clean_sheet_value(row.get(day_col))
+        exercise_name = clean_sheet_value(row.get(exercise_col))
+        if not day_name or not exercise_name:
+            continue
+
+        reps_value = clean_sheet_value(row.get(reps_col)) or "10-12"
+        interval_value = clean_sheet_value(row.get(interval_col)) if interval_col else ""
+        method_value = clean_sheet_value(row.get(method_col)) if method_col else ""
+        notes_value = clean_sheet_value(row.get(notes_col)) if notes_col else ""
+        description_value = clean_sheet_value(row.get(description_col)) if description_col else ""
+        video_value = clean_sheet_value(row.get(video_col)) if video_col else ""
+
+        description_parts = []
+        if description_value:
+            description_parts.append(description_value)
+        if method_value:
+            description_parts.append(f"Método: {method_value}")
+        if interval_value:
+            description_parts.append(f"Intervalo: {interval_value}")
+
+        days_map.setdefault(day_name, []).append({
+            "name": exercise_name,
+            "muscle_group": clean_sheet_value(row.get(muscle_col)) if muscle_col else "",
+            "sets": to_int_or_default(row.get(sets_col), 3) if sets_col else 3,
+            "reps": reps_value,
+            "weight": (clean_sheet_value(row.get(weight_col)) if weight_col else None) or None,
+            "notes": notes_value or None,
+            "image_url": None,
+            "video_url": video_value or None,
+            "description": " | ".join(description_parts) if description_parts else None,
+            "rest_time": rowwise_parse_rest_time_seconds(interval_value, default_seconds=90),
+        })
+
+    return [
+        {"day_name": day_name, "exercises": exercises}
+        for day_name, exercises in days_map.items()
+        if exercises
+    ]
+
+# ==================== FIXTURE SHEETS ====================
+
+TEMPLATE_COLUMNS = [
+    "TREINO", "GRUPO MUSCULAR", "EXERCÍCIO", "VÍDEO", "MÉTODO", "REPETIÇÕES",
+    "CARGA (ALUNO)", "INTERVALO", "OBSERVAÇÃO", "SÉRIES", "DESCRIÇÃO",
+]
+REQUIRED_COLUMNS = {"TREINO", "EXERCÍCIO", "REPETIÇÕES"}
+
+INTERVALS = [
+    "", "60s", "90", "1 min", "1-2 min", "1,5 min", "2m", "45-60s", "1–2", "3", "30\"", "0",
+    "ate 2min", "2 m", "10s", "12", "1.5", "1—2 mins", "x", "  90 s ", "1\x962", None, np.nan,
+    60, 1.5, 0.5, 2.5,
+]
+CELLS = {
+    "TREINO": ["A", "B", "C", " A ", "Treino D", 1, 2],
+    "EXERCÍCIO": [
+        "Supino Reto", "Rosca  Direta ", "Agachamento livre", "crucifixo inclinado",
+        "Leg Press", "Remada Curvada Pronada", "  ", "nan",
+    ],
+    "INTERVALO": INTERVALS,
+    "SÉRIES": [3, 4, "3", "4,0", "2.5", "-1", "x", 0, 3.0, ""],
+    "REPETIÇÕES": ["10-12", 12, "8", "até falha", 10.0],
+    "CARGA (ALUNO)": ["20kg", 15, 12.5, "", "  "],
+    "VÍDEO": ["", "https://youtu.be/abc", None],
+}
+TEXT_CELLS = ["", "obs", "Bi-set", 1, "nan", "NaN", " x "]
+
+def make_sheet(rng: random.Random, rows: int, columns: List[str]) -> pd.DataFrame:
+    def cell(column: str) -> Any:
+        if rng.random() < 0.1:
+            return None
+        return rng.choice(CELLS.get(column, TEXT_CELLS))
+    return pd.DataFrame({column: [cell(column) for _ in range(rows)] for column in columns})
+
+def random_columns(rng: random.Random) -> List[str]:
+    return [c for c in TEMPLATE_COLUMNS if c in REQUIRED_COLUMNS or rng.random() < 0.7]
+
+def sheet_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    buffer = BytesIO()
+    if fmt == "csv":
+        df.to_csv(buffer, index=False)
+    else:
+        df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+def resolve_columns(df: pd.DataFrame) -> Dict[str, Optional[str]]:
+    df.columns = [clean_sheet_value(col) for col in df.columns]
+    normalized: Dict[str, str] = {}
+    for col in df.columns:
+        key = sheet_parser.normalize_sheet_column(col)
+        if key and key not in normalized:
+            normalized[key] = col
+
+    def resolve(*aliases: str) -> Optional[str]:
+        return sheet_parser.resolve_sheet_column(normalized, list(aliases))
+
+    return {
+        "day": resolve("TREINO", "Dia"),
+        "exercise": resolve("EXERCÍCIO", "Exercicio"),
+        "reps": resolve("REPETIÇÕES", "Repeticoes", "Reps"),
+        "muscle": resolve("GRUPO MUSCULAR", "Grupo Muscular"),
+        "sets": resolve("SÉRIES", "Series"),
+        "weight": resolve("CARGA (ALUNO)", "Carga Aluno", "CARGA"),
+        "interval": resolve("INTERVALO", "Descanso"),
+        "notes": resolve("OBSERVAÇÃO", "OBSERVAÇÕES", "Observacao", "Observacoes"),
+        "method": resolve("MÉTODO", "Metodo"),
+        "video": resolve("VÍDEO", "VIDEO", "Link Vídeo", "Link Video"),
+        "description": resolve("DESCRIÇÃO", "Descricao"),
+    }
+
+def as_json(days: List[dict]) -> str:
+    return json.dumps(days, ensure_ascii=False)
+
+# ==================== TESTS ====================
+
+@pytest.mark.parametrize("seed", range(40))
+def test_parse_workout_days_matches_rowwise(seed):
+    rng = random.Random(seed)
+    df = make_sheet(rng, rng.randint(1, 60), random_columns(rng))
+    columns = resolve_columns(df)
+    assert as_json(sheet_parser.parse_workout_days(df, columns)) == as_json(rowwise_parse_workout_days(df, columns))
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx"])
+@pytest.mark.parametrize("seed", range(10))
+def test_parse_sheet_matches_rowwise(seed, fmt):
+    rng = random.Random(seed)
+    content = sheet_bytes(make_sheet(rng, rng.randint(1, 60), random_columns(rng)), fmt)
+    df = sheet_parser.read_sheet(content, f"treino.{fmt}")
+    expected = rowwise_parse_workout_days(df, resolve_columns(df))
+    assert as_json(sheet_parser.parse_sheet(content, f"treino.{fmt}")) == as_json(expected)
+
+def test_all_numeric_sheet_matches_rowwise():
+    # iterrows() upcasts a numeric row to float, so the day and exercise read "1.0"
+    df = pd.DataFrame({"TREINO": [1, 2], "EXERCÍCIO": [10, 11], "REPETIÇÕES": [1.5, 2], "INTERVALO": [60, 2]})
+    columns = resolve_columns(df)
+    assert as_json(sheet_parser.parse_workout_days(df, columns)) == as_json(rowwise_parse_workout_days(df, columns))
+
+def test_parse_rest_time_column_matches_rowwise():
+    values = pd.Series([clean_sheet_value(value) for value in INTERVALS], dtype=object)
+    expected = [rowwise_parse_rest_time_seconds(value, default_seconds=90) for value in values]
+    assert sheet_parser.parse_rest_time_column(values, default_seconds=90).tolist() == expected
+
+def test_clean_sheet_column_matches_clean_sheet_value():
+    values = [None, np.nan, "", "  a ", "nan", "NaN", 1, 1.5, 0, "x", pd.NaT, True]
+    assert sheet_parser.clean_sheet_column(pd.Series(values, dtype=object)).tolist() == [
+        clean_sheet_value(value) for value in values
+    ]
+
+def test_parse_sheet_reports_missing_columns():
+    with pytest.raises(sheet_parser.SheetParseError, match="REPETIÇÕES"):
+        sheet_parser.parse_sheet(b"TREINO;EXERCICIO\nA;Supino\n", "treino.csv")